@@ -1,117 +1,233 @@
-import nemo.collections.asr as nemo_asr
-import librosa
 import torch
 import numpy as np
-import soundfile as sf
 import os
-from sklearn.metrics.pairwise import cosine_similarity
 
-# Load the speaker verification model
-speaker_model = nemo_asr.models.EncDecSpeakerLabelModel.from_pretrained("nvidia/speakerverification_en_titanet_large")
+import models
+from audio_utils import load_audio
+from speaker_index import get_index
+from speaker_ann import get_ann_index, update_ann_index
+from tracing import span, count
 
 speaker_db = "speakers"
 
 
-def extract_embedding(audio_path):
+def extract_embedding(audio, sr=16000):
     """
-    Extract speaker embedding from audio file
-    
+    Extract speaker embedding from an audio file or in-memory buffer
+
     Args:
-        audio_path (str): Path to audio file
-        
+        audio (str | np.ndarray): Path to audio file, or samples recorded at `sr`
+        sr (int): Sample rate of an in-memory `audio`
+
     Returns:
         torch.Tensor: Speaker embedding vector
     """
-    if not os.path.exists(audio_path):
-        raise FileNotFoundError(f"Audio file not found: {audio_path}")
-    
-    try:
-        # Convert to WAV format and extract embedding
-        audio, sr = librosa.load(audio_path, sr=16000, mono=True)
-        temp_wav_path = f"temp_audio_{hash(audio_path) % 1000}.wav"
-        sf.write(temp_wav_path, audio, sr)
-        
-        embedding = speaker_model.get_embedding(temp_wav_path)
-        
-        # Clean up temporary file
-        if os.path.exists(temp_wav_path):
-            os.remove(temp_wav_path)
-            
-        return embedding
-        
-    except Exception as e:
-        # Fallback method: Direct forward pass
-        audio, sr = librosa.load(audio_path, sr=16000, mono=True)
-        
-        # Ensure minimum length (1 second)
-        min_samples = 16000
-        if len(audio) < min_samples:
-            audio = np.pad(audio, (0, min_samples - len(audio)), mode='constant')
-        
-        audio_tensor = torch.from_numpy(audio).unsqueeze(0).float()
-        audio_length = torch.tensor([audio_tensor.shape[1]], dtype=torch.long)
-        
-        speaker_model.eval()
-        with torch.no_grad():
-            logits, embedding = speaker_model.forward(input_signal=audio_tensor, input_signal_length=audio_length)
-        
-        return embedding
-
-def verify_speakers(audio_path, speaker_db="speakers", threshold=0.7):
+    audio = load_audio(audio, 16000, orig_sr=sr)
+
+    # Ensure minimum length (1 second)
+    min_samples = 16000
+    if len(audio) < min_samples:
+        audio = np.pad(audio, (0, min_samples - len(audio)), mode='constant')
+
+    speaker_model = models.get(models.variant("titanet"))
+
+    # Same forward pass `get_embedding` runs, minus the round trip through a WAV file
+    audio_tensor = torch.from_numpy(audio).unsqueeze(0).float().to(speaker_model.device)
+    audio_length = torch.tensor([audio_tensor.shape[1]], dtype=torch.long, device=speaker_model.device)
+
+    with span("embedding"), torch.no_grad():
+        logits, embedding = speaker_model.forward(input_signal=audio_tensor, input_signal_length=audio_length)
+
+    return embedding
+
+
+def _length_buckets(lengths, batch_size, max_pad_ratio, max_batch_samples):
+    """
+    Group clip indices so each group holds clips of similar length: at most
+    `batch_size` clips, the longest at most `max_pad_ratio` times the
+    shortest, and at most `max_batch_samples` samples once padded.
+    """
+    buckets, current = [], []
+    for i in np.argsort(lengths, kind="stable"):
+        if current and (len(current) >= batch_size
+                        or lengths[i] > max_pad_ratio * lengths[current[0]]
+                        or lengths[i] * (len(current) + 1) > max_batch_samples):
+            buckets.append(current)
+            current = []
+        current.append(i)
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def extract_embeddings(audios, sr=16000, batch_size=16, max_pad_ratio=1.25, max_batch_seconds=240):
+    """
+    Extract speaker embeddings for many clips with batched TitaNet passes.
+
+    Clips are sorted into buckets of similar length, zero-padded to the
+    longest clip of their bucket and run together; `input_signal_length`
+    carries each clip's real length, so the results match `extract_embedding`
+    on the individual clips (up to floating-point tolerance).
+
+    Args:
+        audios (list): Paths and/or arrays recorded at `sr` (or AudioBuffers)
+        sr (int): Sample rate of in-memory clips
+        batch_size (int): Most clips per forward pass
+        max_pad_ratio (float): Longest / shortest clip length allowed in one batch
+        max_batch_seconds (float): Cap on padded audio per forward pass (bounds memory)
+
+    Returns:
+        np.ndarray: (len(audios), dim) float32 embeddings, in input order
+    """
+    clips = []
+    for audio in audios:
+        clip = load_audio(audio, 16000, orig_sr=sr)
+        # Same 1-second minimum as extract_embedding
+        if len(clip) < 16000:
+            clip = np.pad(clip, (0, 16000 - len(clip)), mode='constant')
+        clips.append(clip)
+    if not clips:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    speaker_model = models.get(models.variant("titanet"))
+    device = speaker_model.device
+    lengths = np.array([len(clip) for clip in clips])
+    embeddings = [None] * len(clips)
+
+    for bucket in _length_buckets(lengths, batch_size, max_pad_ratio, int(max_batch_seconds * 16000)):
+        longest = lengths[bucket].max()
+        batch = np.zeros((len(bucket), longest), dtype=np.float32)
+        for row, i in enumerate(bucket):
+            batch[row, :lengths[i]] = clips[i]
+
+        signal = torch.from_numpy(batch).to(device)
+        signal_length = torch.from_numpy(lengths[bucket]).long().to(device)
+        with span("embedding"), torch.no_grad():
+            _, batch_embeddings = speaker_model.forward(input_signal=signal, input_signal_length=signal_length)
+        for row, i in enumerate(bucket):
+            embeddings[i] = batch_embeddings[row].cpu().numpy()
+
+    return np.stack(embeddings).astype(np.float32)
+
+
+def verify_speakers(audio, speaker_db="speakers", threshold=0.7, sr=16000, top_k=1,
+                    search="exact", nprobe=8):
     """
     Verify input audio against a database of speaker embeddings.
 
     Args:
-        audio_path (str): Path to input audio file
-        speaker_db (str): Directory containing saved speaker embeddings (.npy or .pt)
+        audio (str | np.ndarray): Path to input audio file, or samples recorded at `sr`
+        speaker_db (str): Speaker database directory (voiceprint store)
         threshold (float): Similarity threshold
+        sr (int): Sample rate of an in-memory `audio`
+        top_k (int): Number of best-scoring speakers to return as candidates
+        search (str): "exact" scans every voiceprint, "ivf" uses the approximate index
+        nprobe (int): Number of IVF cells to scan when search="ivf"
 
     Returns:
-        dict: Contains matched speaker name (or 'REJECTED'), similarity score, and threshold
+        dict: Contains matched speaker name (or 'REJECTED'), similarity score, threshold
+        and the top-k (name, similarity) candidates
     """
-    import glob
-
     # Extract embedding for the input audio
-    input_emb = extract_embedding(audio_path)
-    input_emb_np = input_emb.detach().cpu().numpy().reshape(1, -1)
-
-    best_match = None
-    best_score = -1
+    input_emb = extract_embedding(audio, sr=sr)
+    return verify_embedding(input_emb, speaker_db=speaker_db, threshold=threshold, top_k=top_k,
+                            search=search, nprobe=nprobe)
 
-    # Loop through all saved embeddings in speaker_db
-    for emb_path in glob.glob(os.path.join(speaker_db, "*.npy")):
-        speaker_name = os.path.splitext(os.path.basename(emb_path))[0]
-        db_emb = np.load(emb_path).reshape(1, -1)
 
-        # Cosine similarity
-        sim = cosine_similarity(input_emb_np, db_emb)[0][0]
+def verify_embedding(embedding, speaker_db="speakers", threshold=0.7, top_k=1, search="exact", nprobe=8):
+    """
+    Score an already extracted embedding against the speaker database.
+    Same arguments and result as `verify_speakers`, minus the audio.
+    """
+    if hasattr(embedding, "detach"):
+        embedding = embedding.detach().cpu().numpy()
+    input_emb_np = np.asarray(embedding, dtype=np.float32).reshape(-1)
 
-        if sim > best_score:
-            best_score = sim
-            best_match = speaker_name
+    with span("index_lookup"):
+        if search == "ivf":
+            # Approximate search for very large databases
+            ann = get_ann_index(speaker_db)
+            candidates = ann.search(input_emb_np, k=top_k, nprobe=nprobe) if ann else []
+        else:
+            # Score against every enrolled voiceprint in one matrix-vector product
+            candidates = get_index(speaker_db).search(input_emb_np, k=top_k)
+    best_match, best_score = candidates[0] if candidates else (None, -1)
 
+    count("verifications", status="VERIFIED" if best_score >= threshold else "REJECTED")
     if best_score >= threshold:
         return {
             "match": best_match,
             "similarity": best_score,
             "threshold": threshold,
-            "status": "VERIFIED"
+            "status": "VERIFIED",
+            "candidates": candidates
         }
     else:
         return {
             "match": None,
             "similarity": best_score,
             "threshold": threshold,
-            "status": "REJECTED"
+            "status": "REJECTED",
+            "candidates": candidates
         }
 
 
-#def saving_speaker_embedding(name, audio_path, speaker_db="speakers"):
-#    """
-#    Extract and save speaker embedding to the database.
-#    """
-#    os.makedirs(speaker_db, exist_ok=True)
-#    embedding = extract_embedding(audio_path)
-#    embedding_np = embedding.detach().cpu().numpy()
-#    np.save(os.path.join(speaker_db, f"{name}.npy"), embedding_np)
-#
\ No newline at end of file
+def reenrol_speakers(audio_root, speaker_db="speakers", batch_size=32):
+    """
+    Rebuild every voiceprint from `<audio_root>/<speaker name>/*.wav` (e.g.
+    after a model upgrade), extracting all takes with batched passes.
+
+    Returns:
+        dict: speaker name -> number of takes used
+    """
+    takes, owners = [], []
+    for name in sorted(os.listdir(audio_root)):
+        folder = os.path.join(audio_root, name)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            if filename.lower().endswith(".wav"):
+                takes.append(os.path.join(folder, filename))
+                owners.append(name)
+
+    embeddings = extract_embeddings(takes, batch_size=batch_size)
+    owners = np.array(owners)
+    counts = {}
+    for name in dict.fromkeys(owners):
+        rows = embeddings[owners == name]
+        enrol_speaker(name, rows, speaker_db=speaker_db)
+        counts[name] = len(rows)
+    return counts
+
+
+def enrol_speaker(name, embeddings, speaker_db="speakers", append=False):
+    """
+    Save a voiceprint and add it to the exact and (if built) approximate indexes.
+
+    Args:
+        name (str): Speaker name
+        embeddings (np.ndarray): One embedding or a (takes, dim) array of enrolment takes
+        speaker_db (str): Speaker database directory
+        append (bool): Add the takes to an existing voiceprint instead of replacing it
+
+    Returns:
+        np.ndarray: The speaker's mean embedding after the update
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    mean = get_index(speaker_db).add_takes(name, embeddings, replace=not append)
+    update_ann_index(speaker_db)
+    return mean
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    # python Speaker_Authontication.py reenrol <audio_root> [speaker_db]
+    if len(sys.argv) not in (3, 4) or sys.argv[1] != "reenrol":
+        print("Usage: python Speaker_Authontication.py reenrol <audio_root> [speaker_db]")
+        sys.exit(1)
+    start = time.perf_counter()
+    counts = reenrol_speakers(sys.argv[2], *sys.argv[3:])
+    print(f"Re-enrolled {len(counts)} speakers from {sum(counts.values())} takes "
+          f"in {time.perf_counter() - start:.1f}s")
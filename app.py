@@ -1,13 +1,20 @@
 import streamlit as st
 import sounddevice as sd
-import soundfile as sf
-import tempfile
 import numpy as np
+import datetime
 import os
-
-from functions import manual_authentication, transcribe
-from Speaker_Authontication import verify_speakers, extract_embedding
-from voice_enhancement import voice_enhancement
+from concurrent.futures import ThreadPoolExecutor
+
+import models
+import tracing
+from functions import manual_authentication, add_manual_user, verify_phrase, transcribe_stream, mic_stream
+from Speaker_Authontication import extract_embeddings, enrol_speaker
+from speaker_index import get_index
+from voice_enhancement import enhance_audio
+from audio_utils import AudioBuffer, save_audio
+from pipeline import transcribe_and_verify
+from client import get_client
+from vad import trim_silence, record_until_silence
 
 # ── CONFIG ────────────────────────────────────────────────────────────
 USER_CSV        = "speakers/users.csv"
@@ -16,17 +23,72 @@ EXPECTED_PHRASE = "Hello I need to activate my voice"
 EXPECTED_PHRASE2 = "Hello I need to activate my voice."
 N_REPEATS       = 5
 SR              = 16000
+RECORDINGS_DIR  = "recordings"
 # ───────────────────────────────────────────────────────────────────────
 
 st.title("🎤 Live Mic Transcription + Authentication")
 
+
+# Set VOICE_AUTH_SERVER to send transcription and speaker embedding to server.py
+REMOTE = get_client()
+
+
+@st.cache_resource(show_spinner="Loading models…")
+def warm_up_models():
+    """
+    Load the app's models once per server process (not once per rerun).
+    With an inference server only the enhancement model is loaded here.
+    """
+    return models.warm_up(["clearvoice16k"] if REMOTE else models.DEFAULT_MODELS)
+
+
+with st.sidebar:
+    st.caption("Model load times")
+    for name, seconds in warm_up_models().items():
+        st.caption(f"{name}: {seconds:.1f}s")
+    if tracing.is_enabled():
+        # VOICE_AUTH_TRACE=1: per-stage latency of this server process
+        with st.expander("Stage latency"):
+            for name, s in sorted(tracing.to_json()["spans"].items()):
+                st.caption(f"{name}: {s['count']}× mean {s['mean_s'] * 1000:.0f} ms, p95 {s['p95_s'] * 1000:.0f} ms")
+
 # Initialize session state
-st.session_state.setdefault("wav_path", None)
+st.session_state.setdefault("recording", None)   # (samples, sample rate) of the last take
 st.session_state.setdefault("enrol_step", 0)
-st.session_state.setdefault("enrol_embeds", [])
+st.session_state.setdefault("enrol_takes", [])      # accepted 16 kHz takes, embedded on save
 
 # Global record duration slider
 DURATION = st.slider("🎙️ Record duration (seconds)", 1, 10, 3)
+KEEP_RECORDINGS = st.checkbox("💾 Keep enhanced recordings on disk", value=False)
+STOP_AT_SILENCE = st.checkbox("✂️ Stop recording when I stop talking", value=True)
+
+
+def record_take():
+    """
+    Record up to DURATION seconds, trim leading/trailing silence and show how
+    much audio the VAD removed before the expensive stages.
+    """
+    with tracing.span("record"):
+        if STOP_AT_SILENCE:
+            rec = record_until_silence(mic_stream(duration=DURATION), SR)
+        else:
+            rec = sd.rec(int(DURATION * SR), samplerate=SR, channels=1)
+            sd.wait()
+    with tracing.span("vad"):
+        trimmed, vad_stats = trim_silence(rec, SR)
+    st.caption(f"VAD removed {vad_stats['removed_s']:.1f}s of {vad_stats['original_s']:.1f}s "
+               f"({vad_stats['removed_ratio']:.0%})")
+    return trimmed
+
+
+def keep_recording(audio, sr, prefix):
+    """
+    Save a take under RECORDINGS_DIR when the user asked to keep recordings.
+    """
+    if KEEP_RECORDINGS:
+        ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        save_audio(os.path.join(RECORDINGS_DIR, f"{prefix}_{ts}.wav"), audio, sr)
+
 
 # ╭──────────────── Voice-authentication quick test ─────────────────╮
 with st.expander("🔊 Voice Authentication (one-shot)"):
@@ -35,89 +97,107 @@ with st.expander("🔊 Voice Authentication (one-shot)"):
 
     if st.button("🎙️ Record once"):
         st.info("Recording…")
-        rec = sd.rec(int(DURATION * SR), samplerate=SR, channels=1)
-        sd.wait()
-
-        tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-        sf.write(tmp.name, rec, SR)
+        rec = record_take()
 
-        # Enhance the audio before storing and playing
-        enhanced_path = voice_enhancement(tmp.name)
-        st.session_state.wav_path = enhanced_path
-        st.audio(enhanced_path)  # Now plays enhanced audio
+        # Enhance the audio in memory before storing and playing
+        enhanced, enhanced_sr = enhance_audio(rec, SR)
+        st.session_state.recording = (enhanced, enhanced_sr)
+        st.audio(enhanced, sample_rate=enhanced_sr)  # Now plays enhanced audio
+        keep_recording(enhanced, enhanced_sr, "voiceprint")
         st.success("Recording complete.")
 
+# ╭──────────────────── Live (streaming) transcription ───────────────╮
+with st.expander("📝 Live transcription (streaming)"):
+    st.write("Text appears while you talk; the final transcript is shown when recording stops.")
+
+    if st.button("🎙️ Start live transcription"):
+        live_text = st.empty()
+        for result in transcribe_stream(mic_stream(duration=DURATION)):
+            if result["final"]:
+                live_text.markdown(f"**Transcription:** {result['text']}")
+            else:
+                live_text.markdown(f"_{result['text']}…_")
+
 # ── Transcribe + identify that one sample ───────────────────────────
-if st.session_state.wav_path:
+if st.session_state.recording is not None:
     st.header("🧠 Processing…")
 
-    enhanced_path = st.session_state.wav_path  # Use already enhanced audio
+    enhanced, enhanced_sr = st.session_state.recording  # Use already enhanced audio
 
-    with st.spinner("Transcribing…"):
-        txt = transcribe(enhanced_path)
-        st.write("**Transcription:**", txt)
+    # Transcription and speaker verification only need the enhanced audio: run them side by side
+    with st.spinner("Transcribing and authenticating speaker…"), tracing.request("app_verify"):
+        results = transcribe_and_verify(enhanced, enhanced_sr, speaker_db=SPEAKER_DB)
 
-        with open("transcripts.txt", "a") as f:
-            f.write(txt + "\n")
+    txt = results["text"]
+    st.write("**Transcription:**", txt)
+
+    with open("transcripts.txt", "a") as f:
+        f.write(txt + "\n")
 
     st.success("Transcript saved.")
 
-    with st.spinner("Authenticating speaker…"):
-        res = verify_speakers(enhanced_path, speaker_db=SPEAKER_DB)
-        if res["status"] == "VERIFIED":
-            st.success(f"🔐 Speaker: {res['match']} (similarity {res['similarity']:.2f})")
-        else:
-            st.warning("⚠️ Speaker not recognized.")
+    res = results["speaker"]
+    if res["status"] == "VERIFIED":
+        st.success(f"🔐 Speaker: {res['match']} (similarity {res['similarity']:.2f})")
+    else:
+        st.warning("⚠️ Speaker not recognized.")
 
 # ╭──────────── 5-shot Voice-print enrolment (new UI) ────────────────╮
 st.subheader("📋 Enrol a new speaker (5× same phrase)")
 
 step = st.session_state.enrol_step
-embs = st.session_state.enrol_embeds
+takes = st.session_state.enrol_takes
 
-st.progress(len(embs) / N_REPEATS, text=f"{len(embs)}/{N_REPEATS} successful recordings captured")
+st.progress(len(takes) / N_REPEATS, text=f"{len(takes)}/{N_REPEATS} successful recordings captured")
 
 if step < N_REPEATS and st.button("🎙️ Record a phrase"):
     st.info(f"Say exactly: **{EXPECTED_PHRASE}**")
 
-    rec = sd.rec(int(DURATION * SR), samplerate=SR, channels=1)
-    sd.wait()
-
-    tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-    sf.write(tmp.name, rec, SR)
+    rec = record_take()
 
     # Enhance
-    enhanced_path = voice_enhancement(tmp.name)
-    st.audio(enhanced_path)
-
-    # Transcribe
-    spoken = transcribe(enhanced_path).lower().strip()
-    st.write("**Transcription:**", spoken)
-    st.session_state.wav_path = enhanced_path
+    enhanced, enhanced_sr = enhance_audio(rec, SR)
+    st.audio(enhanced, sample_rate=enhanced_sr)
+    keep_recording(enhanced, enhanced_sr, "enrol")
+
+    # Score the expected phrase (one teacher-forced Whisper pass, no decoding).
+    # Accepted takes are kept at 16 kHz and embedded together on save.
+    take = AudioBuffer(enhanced, enhanced_sr)
+    if REMOTE:
+        phrase = REMOTE.verify_phrase(take.at(SR), [EXPECTED_PHRASE, EXPECTED_PHRASE2], sr=SR)
+    else:
+        phrase = verify_phrase(take, [EXPECTED_PHRASE, EXPECTED_PHRASE2], sr=enhanced_sr)
+    st.write(f"**Phrase confidence:** {phrase['confidence']:.2f} (needs {phrase['threshold']:.2f})")
+    st.session_state.recording = (enhanced, enhanced_sr)
 
-    if EXPECTED_PHRASE not in spoken and EXPECTED_PHRASE2 not in spoken:
+    if not phrase["accepted"]:
         st.error("❌ Phrase didn’t match – try again.")
     else:
-        # Extract embedding for this recording
-        emb = extract_embedding(enhanced_path)
-        embs.append(emb)
+        takes.append(take.at(SR))
         st.session_state.enrol_step += 1
         st.success("✅ Take accepted.")
 
 # After 5 recordings
 if step == N_REPEATS:
-    avg_embed = np.mean(np.stack(embs), axis=0)
     new_name = st.text_input("Label for this voice-print:")
+    existing = bool(new_name) and new_name in get_index(SPEAKER_DB)
+    append = existing and st.checkbox(f"Add these takes to the existing voice-print of {new_name}", value=True)
 
     if st.button("💾 Save voice-print") and new_name:
-        # Save the averaged embedding
-        os.makedirs(SPEAKER_DB, exist_ok=True)
-        final_path = os.path.join(SPEAKER_DB, f"{new_name}.npy")
-        np.save(final_path, avg_embed)
-        
-        st.success(f"Enrolled new speaker: {new_name}")
+        # One batched TitaNet pass over all takes; sent concurrently, the
+        # server's micro-batcher groups them the same way
+        if REMOTE:
+            with ThreadPoolExecutor(len(takes)) as pool:
+                embs = np.stack(list(pool.map(lambda t: REMOTE.extract_embedding(t, sr=SR), takes)))
+        else:
+            embs = extract_embeddings(takes, sr=SR)
+        # The store keeps running statistics, so the takes are folded in and
+        # the voiceprint is searchable right away
+        enrol_speaker(new_name, embs, speaker_db=SPEAKER_DB, append=append)
+
+        st.success(f"{'Updated' if append else 'Enrolled new'} speaker: {new_name}")
         st.session_state.enrol_step = 0
-        st.session_state.enrol_embeds = []
+        st.session_state.enrol_takes = []
 
 # ╭───────────────────── Manual login / enrolment ────────────────────╮
 with st.expander("🔐 Manual Login / Enrollment"):
@@ -138,8 +218,9 @@ with st.expander("🔐 Manual Login / Enrollment"):
         npw = st.text_input("Choose a password:", type="password")
         if st.form_submit_button("Add user"):
             if nu and npw:
-                with open(USER_CSV, "a") as f:
-                    f.write(f"\n{nu},{npw}")
-                st.success(f"✅ Added user '{nu}'.")
+                if add_manual_user(nu, npw, manual_csv=USER_CSV):
+                    st.success(f"✅ Added user '{nu}'.")
+                else:
+                    st.error(f"❌ Username '{nu}' is already taken.")
             else:
                 st.warning("Both fields required.")
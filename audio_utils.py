@@ -0,0 +1,85 @@
+import os
+import threading
+import numpy as np
+import librosa
+import soundfile as sf
+
+from tracing import span
+
+
+class AudioBuffer:
+    """
+    Mono samples that know their sample rate.
+
+    `at(sr)` resamples once per target rate and caches the result, so the
+    stages that need the same rate (e.g. Whisper and TitaNet at 16 kHz)
+    share one conversion. The returned arrays are shared: do not modify them.
+    """
+
+    def __init__(self, samples, sr):
+        self.sr = sr
+        self.samples = load_audio(samples, sr)
+        self._by_rate = {sr: self.samples}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.samples)
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sr
+
+    def at(self, sr):
+        """
+        The samples at `sr`, converted on first request.
+        """
+        samples = self._by_rate.get(sr)
+        if samples is None:
+            with self._lock:
+                samples = self._by_rate.get(sr)
+                if samples is None:
+                    with span("resample"):
+                        samples = librosa.resample(self.samples, orig_sr=self.sr, target_sr=sr)
+                    self._by_rate[sr] = samples
+        return samples
+
+
+def load_audio(audio, sr=16000, orig_sr=None):
+    """
+    Return `audio` as a mono float32 array at `sr`.
+
+    Args:
+        audio (str | np.ndarray | AudioBuffer): Path to an audio file, samples
+            already in memory, or an AudioBuffer (which carries its own rate)
+        sr (int): Sample rate the caller needs
+        orig_sr (int): Sample rate of an in-memory `audio` (defaults to `sr`)
+
+    Returns:
+        np.ndarray: 1-D float32 samples at `sr`
+    """
+    if isinstance(audio, AudioBuffer):
+        return audio.at(sr)
+    if isinstance(audio, (str, os.PathLike)):
+        if not os.path.exists(audio):
+            raise FileNotFoundError(f"Audio file not found: {audio}")
+        with span("decode"):
+            speech, _ = librosa.load(audio, sr=sr, mono=True)
+        return speech
+
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.ndim == 2:
+        # (samples, channels) from sounddevice or (channels, samples) from the enhancers
+        audio = audio.mean(axis=1) if audio.shape[0] > audio.shape[1] else audio.mean(axis=0)
+    if orig_sr and orig_sr != sr:
+        with span("resample"):
+            audio = librosa.resample(audio, orig_sr=orig_sr, target_sr=sr)
+    return audio
+
+
+def save_audio(path, audio, sr):
+    """
+    Write a mono float buffer to `path` as 16-bit PCM.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    sf.write(path, audio, sr, subtype="PCM_16")
+    return path
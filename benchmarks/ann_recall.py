@@ -0,0 +1,120 @@
+"""
+Recall vs. latency of the IVF speaker index against the exact matrix scan.
+
+    python -m benchmarks.ann_recall --n-speakers 100000 --nprobe 1 4 8 16 32
+    python -m benchmarks.ann_recall --speaker-db speakers
+
+Queries are noisy copies of enrolled voiceprints, so the exact scan's top-1
+is the ground truth the approximate search is scored against.
+"""
+import argparse
+import json
+import time
+import numpy as np
+
+from speaker_ann import IVFIndex, _normalize_rows
+from speaker_index import SpeakerIndex
+
+
+def synthetic_voiceprints(n, dim=192, n_clusters=512, seed=0):
+    """
+    Clustered unit vectors, roughly shaped like TitaNet embeddings
+    (speakers with similar voices sit close together).
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    members = centres[rng.integers(0, n_clusters, n)]
+    return _normalize_rows(members + 0.6 * rng.standard_normal((n, dim)).astype(np.float32))
+
+
+def exact_topk(matrix, queries, k):
+    scores = queries @ matrix.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--speaker-db", help="Benchmark the real voiceprints in this directory")
+    parser.add_argument("--n-speakers", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=192)
+    parser.add_argument("--n-queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--noise", type=float, default=0.3, help="Query noise relative to the voiceprint")
+    parser.add_argument("--output", help="Write results as JSON here")
+    args = parser.parse_args()
+
+    if args.speaker_db:
+        exact = SpeakerIndex(args.speaker_db)
+        exact.refresh(force=True)
+        names, matrix = list(exact.names), exact.matrix.copy()
+    else:
+        matrix = synthetic_voiceprints(args.n_speakers, args.dim)
+        names = [f"speaker_{i}" for i in range(len(matrix))]
+
+    rng = np.random.default_rng(1)
+    targets = rng.integers(0, len(matrix), args.n_queries)
+    queries = _normalize_rows(matrix[targets] + args.noise / np.sqrt(matrix.shape[1])
+                              * rng.standard_normal((args.n_queries, matrix.shape[1])).astype(np.float32))
+    k = min(args.k, len(matrix))
+    truth = exact_topk(matrix, queries, k)
+
+    exact_times = []
+    for q in queries:
+        start = time.perf_counter()
+        scores = matrix @ q
+        np.argpartition(-scores, k - 1)[:k]
+        exact_times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    ivf = IVFIndex.build(names, matrix, n_lists=args.n_lists)
+    build_s = time.perf_counter() - start
+
+    results = {
+        "n_speakers": len(matrix),
+        "dim": int(matrix.shape[1]),
+        "n_lists": ivf.n_lists,
+        "build_s": build_s,
+        "ivf_memory_mb": ivf._vectors.nbytes / 2**20,
+        "exact": {"p50_ms": percentile_ms(exact_times, 50), "p99_ms": percentile_ms(exact_times, 99),
+                  "memory_mb": matrix.nbytes / 2**20},
+        "ivf": [],
+    }
+    print(f"{len(matrix)} voiceprints, {ivf.n_lists} lists, built in {build_s:.1f}s")
+    print(f"exact scan: p50 {results['exact']['p50_ms']:.2f} ms  p99 {results['exact']['p99_ms']:.2f} ms")
+    print(f"{'nprobe':>6} {'recall@1':>9} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8}")
+
+    for nprobe in args.nprobe:
+        times, hits1, hitsk = [], 0, 0
+        for q, true_rows in zip(queries, truth):
+            start = time.perf_counter()
+            found = ivf.search(q, k=k, nprobe=nprobe)
+            times.append(time.perf_counter() - start)
+            found_rows = {ivf._rows[name] for name, _ in found}
+            hits1 += bool(found) and ivf._rows[found[0][0]] == true_rows[0]
+            hitsk += len(found_rows & set(true_rows.tolist()))
+        row = {
+            "nprobe": nprobe,
+            "recall_at_1": hits1 / len(queries),
+            f"recall_at_{k}": hitsk / (len(queries) * k),
+            "p50_ms": percentile_ms(times, 50),
+            "p99_ms": percentile_ms(times, 99),
+        }
+        results["ivf"].append(row)
+        print(f"{nprobe:>6} {row['recall_at_1']:>9.3f} {row[f'recall_at_{k}']:>9.3f} "
+              f"{row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Helpers shared by the benchmark and load-test scripts.
+"""
+import threading
+import numpy as np
+
+from models import rss_mb  # noqa: F401  (re-exported for the benchmark scripts)
+
+
+class RSSSampler:
+    """
+    Background thread that records the peak RSS seen while it runs.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_mb = rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            current = rss_mb()
+            if current is not None and (self.peak_mb is None or current > self.peak_mb):
+                self.peak_mb = current
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def latency_summary(seconds):
+    """
+    p50/p95/p99/mean/max of a list of durations, in milliseconds.
+    """
+    if not seconds:
+        return {}
+    ms = np.asarray(seconds) * 1000
+    return {
+        "count": int(ms.size),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+        "max_ms": float(ms.max()),
+    }
+
+
+def synthetic_speech(duration, sr=16000, seed=0):
+    """
+    Speech-like test signal: voiced syllables (~4 per second) with a drifting
+    pitch, formant-shaped harmonics, short pauses and a low noise floor.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    t = np.arange(n) / sr
+
+    # Pitch drifts between ~100 and ~220 Hz with a little vibrato
+    f0 = 160 + 60 * np.sin(2 * np.pi * 0.3 * t + rng.uniform(0, np.pi)) + 3 * np.sin(2 * np.pi * 5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    formants = (500, 1500, 2500)
+    voiced = np.zeros(n)
+    for h in range(1, 20):
+        gain = sum(np.exp(-((h * 160 - f) / 300) ** 2) for f in formants) / h
+        voiced += gain * np.sin(h * phase)
+
+    # Syllable envelope with roughly one pause per second
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t + rng.uniform(0, np.pi)), 0, None) ** 2
+    pauses = (np.sin(2 * np.pi * 0.9 * t + rng.uniform(0, np.pi)) > -0.7).astype(float)
+    speech = voiced * syllables * pauses
+    speech = 0.5 * speech / (np.max(np.abs(speech)) or 1.0)
+    return (speech + 0.005 * rng.standard_normal(n)).astype(np.float32)
@@ -0,0 +1,62 @@
+"""
+Batched (length-bucketed) embedding extraction against one clip at a time.
+
+Embeds every WAV under a folder both ways and reports the throughput of each
+and how far the batched embeddings are from the single-clip ones (they
+should agree to within floating-point noise).
+
+    python -m benchmarks.embedding_batch --wav-dir recordings
+    python -m benchmarks.embedding_batch --wav-dir speakers_audio --batch-size 32 --max-pad-ratio 1.5
+"""
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+import models
+from audio_utils import load_audio
+from Speaker_Authontication import extract_embedding, extract_embeddings
+
+SR = 16000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wav-dir", required=True, help="Folder of speech recordings (searched recursively)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-pad-ratio", type=float, default=1.25)
+    args = parser.parse_args()
+
+    wav_paths = sorted(glob.glob(os.path.join(args.wav_dir, "**", "*.wav"), recursive=True))
+    if not wav_paths:
+        parser.error(f"No .wav files in {args.wav_dir}")
+    clips = [load_audio(path, SR) for path in wav_paths]
+    audio_s = sum(len(clip) for clip in clips) / SR
+
+    models.warm_up(["titanet"])
+    extract_embedding(clips[0], SR)        # warm-up pass
+
+    start = time.perf_counter()
+    single = np.stack([extract_embedding(clip, SR).cpu().numpy().reshape(-1) for clip in clips])
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = extract_embeddings(clips, SR, batch_size=args.batch_size, max_pad_ratio=args.max_pad_ratio)
+    batched_s = time.perf_counter() - start
+
+    max_abs = float(np.max(np.abs(single - batched)))
+    single /= np.linalg.norm(single, axis=1, keepdims=True)
+    batched /= np.linalg.norm(batched, axis=1, keepdims=True)
+    cosines = np.sum(single * batched, axis=1)
+
+    print(f"{len(clips)} clips, {audio_s:.0f}s of audio")
+    print(f"one at a time   {single_s:7.2f}s  {len(clips) / single_s:7.1f} clips/s")
+    print(f"batched         {batched_s:7.2f}s  {len(clips) / batched_s:7.1f} clips/s  "
+          f"({single_s / batched_s:.2f}x)")
+    print(f"batched vs single: max |diff| {max_abs:.2e}, min cosine {np.min(cosines):.6f}")
+
+
+if __name__ == "__main__":
+    main()
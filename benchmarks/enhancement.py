@@ -0,0 +1,69 @@
+"""
+Real-time factor of every enhancement backend on this machine.
+
+    python -m benchmarks.enhancement                       # writes enhancement_rtf.json
+    python -m benchmarks.enhancement --backends clearvoice dns64 --durations 3 10
+
+The JSON it writes is what `enhancement_backends.select_backend` (and
+`enhance_audio(..., latency_budget_s=...)`) uses to pick a backend.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import models
+from benchmarks.common import synthetic_speech
+from enhancement_backends import BACKENDS, RTF_TABLE_PATH
+
+SR = 16000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=[name for name in BACKENDS if name != "none"])
+    parser.add_argument("--durations", type=float, nargs="+", default=[1, 3, 10])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default=RTF_TABLE_PATH)
+    args = parser.parse_args()
+
+    report = {"backends": {}}
+    print(f"{'backend':14s} {'load s':>7} {'RTF':>7}  per duration")
+    for name in args.backends:
+        backend = BACKENDS[name]
+        try:
+            backend.load()
+        except Exception as e:
+            print(f"{name:14s} unavailable: {e}")
+            continue
+
+        per_duration = {}
+        for duration in args.durations:
+            audio = synthetic_speech(duration, SR)
+            backend.enhance(audio, SR)      # warm-up
+            times = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                backend.enhance(audio, SR)
+                times.append(time.perf_counter() - start)
+            per_duration[f"{duration:g}"] = float(np.median(times)) / duration
+
+        # Budget selection uses the worst case over the tested durations
+        rtf = max(per_duration.values())
+        report["backends"][name] = {
+            "rtf": rtf,
+            "rtf_by_duration": per_duration,
+            "native_sr": backend.native_sr,
+            "load_s": models.load_times().get(backend.model_name),
+        }
+        rtfs = "  ".join(f"{d}s:{r:.3f}" for d, r in per_duration.items())
+        print(f"{name:14s} {report['backends'][name]['load_s'] or 0:>7.1f} {rtf:>7.3f}  {rtfs}")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
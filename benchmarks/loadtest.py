@@ -0,0 +1,142 @@
+"""
+Multi-session load test of the record → enhance → transcribe → verify flow.
+
+Each session replays WAV files through a simulated microphone (a stand-in
+for `sounddevice.rec`/`sounddevice.wait`) and then runs `pipeline.authenticate`,
+the same stage functions app.py uses.
+
+    python -m benchmarks.loadtest --wav-dir recordings --sessions 8 --requests 10
+    python -m benchmarks.loadtest --wav-dir recordings --sessions 32 --stub-models
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from audio_utils import load_audio
+from pipeline import authenticate, default_stages
+from benchmarks.common import RSSSampler, latency_summary, rss_mb
+from benchmarks.stubs import stub_stages
+
+
+class WavMicrophone:
+    """
+    Simulated microphone with the `rec`/`wait` interface of sounddevice.
+
+    `rec` hands out the next clip (truncated or zero-padded to the requested
+    length); `wait` blocks for as long as the real capture would have taken
+    when `realtime` is set. Clips are decoded up front so file I/O does not
+    count as recording time.
+    """
+
+    def __init__(self, clips, realtime=True):
+        self._clips = itertools.cycle(clips)
+        self.realtime = realtime
+        self._done_at = 0.0
+
+    def rec(self, frames, samplerate, channels=1, dtype="float32"):
+        audio = next(self._clips)
+        if len(audio) < frames:
+            audio = np.pad(audio, (0, frames - len(audio)))
+        self._done_at = time.perf_counter() + frames / samplerate
+        return np.repeat(audio[:frames, np.newaxis], channels, axis=1).astype(dtype)
+
+    def wait(self):
+        if self.realtime:
+            time.sleep(max(0.0, self._done_at - time.perf_counter()))
+
+
+def run_session(mic, args, stages, record):
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        rec = mic.rec(int(args.duration * args.sr), samplerate=args.sr, channels=1)
+        mic.wait()
+        record_s = time.perf_counter() - start
+
+        result = authenticate(rec, args.sr, speaker_db=args.speaker_db, stages=stages)
+        timings = dict(result["timings"], record=record_s, total=time.perf_counter() - start)
+        record(timings, result["speaker"]["status"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wav-dir", required=True, help="Folder of WAV files to replay as microphones")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent authentication sessions")
+    parser.add_argument("--requests", type=int, default=5, help="Authentications per session")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds recorded per request")
+    parser.add_argument("--sr", type=int, default=16000)
+    parser.add_argument("--speaker-db", default="speakers")
+    parser.add_argument("--no-realtime", action="store_true", help="Do not wait out the capture time")
+    parser.add_argument("--stub-models", action="store_true", help="Use the NumPy stand-ins instead of real models")
+    parser.add_argument("--output", help="Write the report as JSON here")
+    args = parser.parse_args()
+
+    wav_paths = sorted(glob.glob(os.path.join(args.wav_dir, "*.wav")))
+    if not wav_paths:
+        parser.error(f"No .wav files in {args.wav_dir}")
+
+    stages = stub_stages() if args.stub_models else default_stages()
+    if not args.stub_models:
+        import models
+        models.warm_up(models.DEFAULT_MODELS)
+
+    # Stages and pipeline helpers import torch lazily; keep that import out
+    # of the first timed request
+    import torch  # noqa: F401
+
+    lock = threading.Lock()
+    timings = {}
+    statuses = {}
+
+    def record(sample, status):
+        with lock:
+            for stage, seconds in sample.items():
+                timings.setdefault(stage, []).append(seconds)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    clips = [load_audio(path, args.sr) for path in wav_paths]
+    mics = [WavMicrophone(clips[i % len(clips):] + clips[:i % len(clips)], realtime=not args.no_realtime)
+            for i in range(args.sessions)]
+
+    start_rss = rss_mb()
+    start = time.perf_counter()
+    with RSSSampler() as sampler, ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        for future in [pool.submit(run_session, mic, args, stages, record) for mic in mics]:
+            future.result()
+    wall_s = time.perf_counter() - start
+
+    completed = len(timings.get("total", []))
+    report = {
+        "sessions": args.sessions,
+        "requests": completed,
+        "stub_models": args.stub_models,
+        "wall_s": wall_s,
+        "throughput_rps": completed / wall_s if wall_s else 0.0,
+        "rss_start_mb": start_rss,
+        "rss_peak_mb": sampler.peak_mb,
+        "statuses": statuses,
+        # Sessions run their stages concurrently, so memory is only meaningful process-wide
+        "stages": {stage: latency_summary(values) for stage, values in timings.items()},
+    }
+
+    print(f"{completed} requests over {args.sessions} sessions in {wall_s:.1f}s "
+          f"({report['throughput_rps']:.2f} req/s), peak RSS {sampler.peak_mb or 0:.0f} MiB")
+    print(f"{'stage':12s} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage in ["record", "vad", "enhance", "transcribe", "verify", "total"]:
+        row = report["stages"].get(stage)
+        if row:
+            print(f"{stage:12s} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Accuracy and speed of the optimised model builds against fp32.
+
+Transcribes and embeds every WAV in a folder with the fp32 models and with
+the chosen optimised builds, then reports the word error rate of the
+optimised transcripts against the fp32 ones, the cosine similarity between
+fp32 and optimised embeddings, and the speed-up of each.
+
+    python -m benchmarks.parity --wav-dir recordings
+    python -m benchmarks.parity --wav-dir recordings --whisper onnx --titanet int8 --output parity.json
+    python -m benchmarks.parity --wav-dir recordings --max-wer 0.05 --min-cosine 0.99
+
+The run fails (exit status 1) when the mean WER exceeds --max-wer or the
+lowest embedding cosine falls below --min-cosine.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import models
+from audio_utils import load_audio
+from functions import transcribe, _words
+from Speaker_Authontication import extract_embedding
+
+SR = 16000
+
+
+def word_error_rate(reference, hypothesis):
+    """
+    Word-level edit distance between two transcripts, divided by the
+    number of reference words.
+    """
+    ref, hyp = _words(reference), _words(hypothesis)
+    if not ref:
+        return float(bool(hyp))
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        row = [i]
+        for j, h in enumerate(hyp, 1):
+            row.append(min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + (r != h)))
+        prev = row
+    return prev[-1] / len(ref)
+
+
+def run(clips):
+    """
+    Transcripts, embeddings and per-model seconds with the current builds.
+    """
+    texts, embeddings = [], []
+    seconds = {"whisper": 0.0, "titanet": 0.0}
+    for audio in clips:
+        start = time.perf_counter()
+        texts.append(transcribe(audio, SR))
+        seconds["whisper"] += time.perf_counter() - start
+        start = time.perf_counter()
+        embeddings.append(extract_embedding(audio, SR).cpu().numpy().reshape(-1))
+        seconds["titanet"] += time.perf_counter() - start
+    return texts, np.stack(embeddings), seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wav-dir", required=True, help="Folder of speech recordings")
+    parser.add_argument("--whisper", default="int8", choices=["fp32", "int8", "onnx"])
+    parser.add_argument("--titanet", default="int8", choices=["fp32", "int8"])
+    parser.add_argument("--max-wer", type=float, default=0.05, help="Allowed mean WER against fp32")
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Lowest allowed fp32/optimised embedding cosine")
+    parser.add_argument("--output", help="Write the report as JSON here")
+    args = parser.parse_args()
+
+    wav_paths = sorted(glob.glob(os.path.join(args.wav_dir, "*.wav")))
+    if not wav_paths:
+        parser.error(f"No .wav files in {args.wav_dir}")
+    clips = [load_audio(path, SR) for path in wav_paths]
+
+    results = {}
+    for label, modes in [("fp32", {"whisper": "fp32", "titanet": "fp32"}),
+                         ("optimised", {"whisper": args.whisper, "titanet": args.titanet})]:
+        models.set_inference_mode(**modes)
+        models.warm_up(["whisper", "titanet"])
+        run(clips[:1])      # warm-up pass
+        results[label] = run(clips)
+
+    ref_texts, ref_embs, ref_s = results["fp32"]
+    opt_texts, opt_embs, opt_s = results["optimised"]
+    wers = [word_error_rate(r, h) for r, h in zip(ref_texts, opt_texts)]
+    ref_embs /= np.linalg.norm(ref_embs, axis=1, keepdims=True)
+    opt_embs /= np.linalg.norm(opt_embs, axis=1, keepdims=True)
+    cosines = np.sum(ref_embs * opt_embs, axis=1)
+
+    report = {
+        "clips": len(clips),
+        "whisper_mode": args.whisper,
+        "titanet_mode": args.titanet,
+        "wer_mean": float(np.mean(wers)),
+        "wer_max": float(np.max(wers)),
+        "cosine_mean": float(np.mean(cosines)),
+        "cosine_min": float(np.min(cosines)),
+        "whisper_speedup": ref_s["whisper"] / opt_s["whisper"] if opt_s["whisper"] else None,
+        "titanet_speedup": ref_s["titanet"] / opt_s["titanet"] if opt_s["titanet"] else None,
+        "load_s": models.load_times(),
+    }
+
+    print(f"{len(clips)} clips, whisper={args.whisper} titanet={args.titanet}")
+    print(f"WER vs fp32      mean {report['wer_mean']:.3f}  max {report['wer_max']:.3f}")
+    print(f"cosine vs fp32   mean {report['cosine_mean']:.4f}  min {report['cosine_min']:.4f}")
+    print(f"speed-up         whisper {report['whisper_speedup'] or 0:.2f}x  "
+          f"titanet {report['titanet_speedup'] or 0:.2f}x")
+    for path, ref, hyp, wer in zip(wav_paths, ref_texts, opt_texts, wers):
+        if wer:
+            print(f"  {os.path.basename(path)}: {ref!r} -> {hyp!r}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if report["wer_mean"] > args.max_wer:
+        failures.append(f"mean WER {report['wer_mean']:.3f} > {args.max_wer:.3f}")
+    if report["cosine_min"] < args.min_cosine:
+        failures.append(f"min cosine {report['cosine_min']:.4f} < {args.min_cosine:.4f}")
+    for failure in failures:
+        print(f"PARITY FAILURE: {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"Within tolerance (mean WER ≤ {args.max_wer:.3f}, cosine ≥ {args.min_cosine:.4f})")
+
+
+if __name__ == "__main__":
+    main()
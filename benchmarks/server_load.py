@@ -0,0 +1,93 @@
+"""
+Throughput of the inference server under concurrent clients.
+
+Start the server first, then compare e.g. --max-batch 1 against --max-batch 8:
+
+    python server.py --max-batch 8
+    python -m benchmarks.server_load --url http://127.0.0.1:8765 --clients 16 --requests 20
+    python -m benchmarks.server_load --op verify --wav-dir recordings
+"""
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_utils import load_audio
+from client import InferenceClient, ServerBusy
+from benchmarks.common import latency_summary, synthetic_speech
+
+SR = 16000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=os.environ.get("VOICE_AUTH_SERVER", "http://127.0.0.1:8765"))
+    parser.add_argument("--op", default="transcribe", choices=["transcribe", "embedding", "verify"])
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per client")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds of synthetic speech per request")
+    parser.add_argument("--wav-dir", help="Send these recordings instead of synthetic speech")
+    parser.add_argument("--output", help="Write the report as JSON here")
+    args = parser.parse_args()
+
+    if args.wav_dir:
+        clips = [load_audio(path, SR) for path in sorted(glob.glob(os.path.join(args.wav_dir, "*.wav")))]
+        if not clips:
+            parser.error(f"No .wav files in {args.wav_dir}")
+    else:
+        clips = [synthetic_speech(args.duration, SR, seed=i) for i in range(8)]
+
+    remote = InferenceClient(args.url)
+    call = {"transcribe": remote.transcribe, "embedding": remote.extract_embedding,
+            "verify": remote.verify_speakers}[args.op]
+    lock = threading.Lock()
+    latencies, busy = [], [0]
+
+    def session(i):
+        for j in range(args.requests):
+            start = time.perf_counter()
+            try:
+                call(clips[(i + j) % len(clips)], sr=SR)
+            except ServerBusy:
+                with lock:
+                    busy[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    before = remote.health()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        list(pool.map(session, range(args.clients)))
+    wall_s = time.perf_counter() - start
+    after = remote.health()
+
+    batcher = "transcribe" if args.op == "transcribe" else "embedding"
+    batches = after["batchers"][batcher]["batches"] - before["batchers"][batcher]["batches"]
+    items = after["batchers"][batcher]["items"] - before["batchers"][batcher]["items"]
+    report = {
+        "op": args.op,
+        "clients": args.clients,
+        "requests": len(latencies),
+        "refused": busy[0],
+        "wall_s": wall_s,
+        "throughput_rps": len(latencies) / wall_s if wall_s else 0.0,
+        "mean_batch": items / batches if batches else 0.0,
+        "latency": latency_summary(latencies),
+    }
+    print(f"{args.op}: {len(latencies)} requests from {args.clients} clients in {wall_s:.1f}s "
+          f"({report['throughput_rps']:.1f} req/s), mean batch {report['mean_batch']:.1f}, "
+          f"{busy[0]} refused")
+    print(f"latency p50 {report['latency']['p50_ms']:.0f} ms  p95 {report['latency']['p95_ms']:.0f} ms  "
+          f"p99 {report['latency']['p99_ms']:.0f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
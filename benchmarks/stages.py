@@ -0,0 +1,146 @@
+"""
+Per-stage micro-benchmarks with real-time-factor reporting.
+
+Runs enhancement, transcription, embedding extraction and verification on
+synthetic speech of several durations and records wall time, real-time
+factor (processing time / audio duration) and Python-level allocations.
+
+    python -m benchmarks.stages --output bench.json
+    python -m benchmarks.stages --stub-models --baseline bench.json --threshold 0.15
+
+With --baseline, any stage/duration whose median time grew by more than
+--threshold (relative) is reported and the script exits with status 1.
+Allocation numbers come from tracemalloc, so they cover NumPy buffers but
+not memory PyTorch allocates internally; the RSS delta is reported for that.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from functools import partial
+
+import numpy as np
+
+from benchmarks.common import synthetic_speech, rss_mb
+from benchmarks.stubs import stub_enhance, stub_transcribe, stub_embedding, stub_verify
+
+SR = 16000
+STAGES = ["enhance", "transcribe", "embedding", "verify"]
+
+
+def real_stages():
+    import models
+    from voice_enhancement import enhance_audio
+    from functions import transcribe
+    from Speaker_Authontication import extract_embedding, verify_speakers
+    models.warm_up(models.DEFAULT_MODELS)
+    return {"enhance": enhance_audio, "transcribe": transcribe,
+            "embedding": extract_embedding, "verify": verify_speakers}
+
+
+def stub_stage_fns():
+    return {"enhance": stub_enhance, "transcribe": stub_transcribe,
+            "embedding": stub_embedding, "verify": stub_verify}
+
+
+def measure(fn, repeats, warmup):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    # Allocations in a separate pass so tracing does not skew the timings
+    rss_before = rss_mb()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = rss_mb()
+    return times, peak, (rss_after - rss_before) if rss_before is not None else None
+
+
+def compare(results, baseline, threshold):
+    """
+    Return the entries that got slower than `baseline` by more than `threshold`.
+    """
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get("results", {}).get(key)
+        if not previous:
+            continue
+        change = current["median_s"] / previous["median_s"] - 1 if previous["median_s"] else 0.0
+        if change > threshold:
+            regressions.append((key, previous["median_s"], current["median_s"], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=float, nargs="+", default=[1, 3, 10, 30])
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--stub-models", action="store_true", help="Benchmark the NumPy stand-ins instead of real models")
+    parser.add_argument("--speaker-db", default="speakers")
+    parser.add_argument("--output", help="Write results as JSON here")
+    parser.add_argument("--baseline", help="Previous JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed relative slowdown vs. the baseline")
+    args = parser.parse_args()
+
+    fns = stub_stage_fns() if args.stub_models else real_stages()
+    results = {}
+    print(f"{'stage':12s} {'dur s':>6} {'median ms':>10} {'RTF':>8} {'alloc MiB':>10}")
+    for duration in args.durations:
+        audio = synthetic_speech(duration, SR)
+        calls = {
+            "enhance": partial(fns["enhance"], audio, SR),
+            "transcribe": partial(fns["transcribe"], audio, sr=SR),
+            "embedding": partial(fns["embedding"], audio, sr=SR),
+            "verify": partial(fns["verify"], audio, speaker_db=args.speaker_db, sr=SR),
+        }
+        for stage in args.stages:
+            times, alloc_peak, rss_delta = measure(calls[stage], args.repeats, args.warmup)
+            median = float(np.median(times))
+            results[f"{stage}@{duration:g}s"] = {
+                "stage": stage,
+                "duration_s": duration,
+                "median_s": median,
+                "min_s": float(np.min(times)),
+                "rtf": median / duration,
+                "alloc_peak_mb": alloc_peak / 2**20,
+                "rss_delta_mb": rss_delta,
+            }
+            print(f"{stage:12s} {duration:>6g} {median * 1000:>10.1f} {median / duration:>8.3f} "
+                  f"{alloc_peak / 2**20:>10.1f}")
+
+    report = {
+        "meta": {
+            "stub_models": args.stub_models,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeats": args.repeats,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for key, before, after, change in regressions:
+            print(f"REGRESSION {key}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms (+{change:.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
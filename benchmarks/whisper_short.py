@@ -0,0 +1,95 @@
+"""
+Latency of the short-utterance Whisper fast path against the plain path.
+
+Transcribes clips of the app's record durations (the DURATION slider runs
+from 1 to 10 s, default 3) with `_transcribe_arrays(fast=False)` (features
+over the padded 30 s window, no cap on new tokens) and with the fast path
+(features over the audio only, a duration-bound token budget and a reused
+static KV cache), and reports the median latency of each and whether the
+transcripts agree.
+
+    python -m benchmarks.whisper_short
+    python -m benchmarks.whisper_short --wav-dir recordings --durations 1,3,5,10 --repeats 10
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+import models
+from audio_utils import load_audio
+from benchmarks.common import synthetic_speech
+from functions import _transcribe_arrays, _max_new_tokens
+
+SR = 16000
+
+
+def clips_for(duration, recordings):
+    """
+    Clips of `duration` seconds: cut from the recordings when given
+    (padded with silence if shorter), otherwise synthetic speech.
+    """
+    n = int(duration * SR)
+    if not recordings:
+        return [synthetic_speech(duration, SR)]
+    return [np.pad(clip[:n], (0, max(0, n - len(clip)))) for clip in recordings]
+
+
+def median_ms(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wav-dir", help="Speech recordings to cut clips from (default: synthetic speech)")
+    parser.add_argument("--durations", default="1,3,5,10", help="Comma-separated clip durations in seconds")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="Write the report as JSON here")
+    args = parser.parse_args()
+
+    recordings = []
+    if args.wav_dir:
+        recordings = [load_audio(path, SR) for path in sorted(glob.glob(os.path.join(args.wav_dir, "*.wav")))]
+        if not recordings:
+            parser.error(f"No .wav files in {args.wav_dir}")
+    models.warm_up([models.variant("whisper")])
+
+    report = []
+    print(f"{'clip s':>7} {'tokens':>7} {'plain ms':>9} {'fast ms':>9} {'speed-up':>9} {'same text':>10}")
+    for duration in [float(d) for d in args.durations.split(",")]:
+        clips = clips_for(duration, recordings)
+        plain_ms, fast_ms, same = [], [], 0
+        for clip in clips:
+            plain = _transcribe_arrays([clip], fast=False)[0]
+            fast = _transcribe_arrays([clip], fast=True)[0]      # also allocates the reused cache
+            same += plain.strip() == fast.strip()
+            plain_ms.append(median_ms(lambda: _transcribe_arrays([clip], fast=False), args.repeats))
+            fast_ms.append(median_ms(lambda: _transcribe_arrays([clip], fast=True), args.repeats))
+        row = {
+            "duration_s": duration,
+            "clips": len(clips),
+            "max_new_tokens": _max_new_tokens(duration),
+            "plain_ms": float(np.mean(plain_ms)),
+            "fast_ms": float(np.mean(fast_ms)),
+            "same_text": same / len(clips),
+        }
+        row["speedup"] = row["plain_ms"] / row["fast_ms"]
+        report.append(row)
+        print(f"{duration:>7.1f} {row['max_new_tokens']:>7} {row['plain_ms']:>9.0f} {row['fast_ms']:>9.0f} "
+              f"{row['speedup']:>8.2f}x {row['same_text']:>10.0%}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"whisper": models.variant("whisper"), "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Run the enhance → transcribe → identify chain over a whole recording archive.
+
+Files are spread over a pool of worker processes. Each worker loads the
+models once, when it starts, and gets an even share of the CPU cores for
+PyTorch's intra-op threads, so the workers do not oversubscribe the machine.
+Every finished file is appended to a JSONL manifest straight away; running
+the same command again skips files the manifest already has (files that
+failed are retried).
+
+    python bulk_process.py recordings/ --manifest results.jsonl
+    python bulk_process.py archive/ --workers 32 --manifest backfill.jsonl
+    python bulk_process.py recordings/ --stub-models        # NumPy stand-ins, no model downloads
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+
+SR = 16000
+AUDIO_EXTENSIONS = (".wav", ".flac", ".mp3", ".ogg")
+
+_worker = {}        # per-process state set up by _init_worker
+
+
+def find_audio(root):
+    """
+    Every audio file under `root` (or `root` itself), sorted.
+    """
+    if os.path.isfile(root):
+        return [root]
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        found.extend(os.path.join(dirpath, name) for name in filenames
+                     if name.lower().endswith(AUDIO_EXTENSIONS))
+    return sorted(found)
+
+
+def load_manifest(path):
+    """
+    {file path: record} of the files a previous run finished successfully.
+    A line cut short by a crash is ignored.
+    """
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" not in record:
+                done[record["path"]] = record
+    return done
+
+
+def _init_worker(intra_op_threads, stub_models, speaker_db, vad, warm_path):
+    from audio_utils import load_audio
+    from pipeline import set_intra_op_threads
+
+    set_intra_op_threads(intra_op_threads)
+    if stub_models:
+        from benchmarks.stubs import stub_stages
+        stages = stub_stages()
+    else:
+        import models
+        from pipeline import default_stages
+        stages = default_stages()
+        models.warm_up(models.DEFAULT_MODELS)
+    # The first decode pays for librosa's lazy imports; keep that out of the timings
+    try:
+        load_audio(warm_path, SR)
+    except Exception:
+        pass        # a broken file is reported by process_file, not here
+    _worker.update(stages=stages, speaker_db=speaker_db, vad=vad)
+
+
+def process_file(path):
+    """
+    Run one file through the chain in this worker; returns its manifest record.
+    """
+    from audio_utils import load_audio
+    from vad import trim_silence
+
+    stages = _worker["stages"]
+    record = {"path": path, "worker": os.getpid()}
+    timings = {}
+    start = time.perf_counter()
+    try:
+        audio = load_audio(path, SR)
+        timings["load"] = time.perf_counter() - start
+        record["duration_s"] = len(audio) / SR
+
+        if _worker["vad"]:
+            t = time.perf_counter()
+            audio, vad_stats = trim_silence(audio, SR)
+            timings["vad"] = time.perf_counter() - t
+            record["vad_removed_s"] = vad_stats["removed_s"]
+
+        # Stages run one after the other: the parallelism is across files
+        t = time.perf_counter()
+        enhanced, enhanced_sr = stages["enhance"](audio, SR)
+        timings["enhance"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        record["text"] = stages["transcribe"](enhanced, sr=enhanced_sr).strip()
+        timings["transcribe"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        speaker = stages["verify"](enhanced, speaker_db=_worker["speaker_db"], sr=enhanced_sr)
+        timings["verify"] = time.perf_counter() - t
+        record.update(speaker=speaker["match"], similarity=speaker["similarity"], status=speaker["status"])
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    timings["total"] = time.perf_counter() - start
+    record["timings"] = timings
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="Audio files or directories (searched recursively)")
+    parser.add_argument("--manifest", default="bulk_results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--intra-op-threads", type=int, default=None,
+                        help="PyTorch threads per worker (default: cores / workers)")
+    parser.add_argument("--speaker-db", default="speakers")
+    parser.add_argument("--no-vad", action="store_true", help="Do not trim silence before enhancement")
+    parser.add_argument("--stub-models", action="store_true", help="Use the NumPy stand-ins instead of real models")
+    args = parser.parse_args(argv)
+
+    paths = [path for item in args.inputs for path in find_audio(item)]
+    done = load_manifest(args.manifest)
+    todo = [path for path in paths if path not in done]
+    print(f"{len(paths)} files, {len(paths) - len(todo)} already in {args.manifest}, {len(todo)} to process")
+    if not todo:
+        return
+
+    workers = max(1, min(args.workers, len(todo)))
+    intra_op_threads = args.intra_op_threads or max(1, (os.cpu_count() or 1) // workers)
+
+    # Spawn rather than fork: workers must not inherit a half-initialised PyTorch
+    context = multiprocessing.get_context("spawn")
+    start = time.perf_counter()
+    n_ok = n_failed = 0
+    audio_s = 0.0
+    with context.Pool(workers, initializer=_init_worker,
+                      initargs=(intra_op_threads, args.stub_models, args.speaker_db, not args.no_vad,
+                                todo[0])) as pool, \
+            open(args.manifest, "a", encoding="utf-8") as manifest:
+        for i, record in enumerate(pool.imap_unordered(process_file, todo), 1):
+            # One line per file, flushed at once, so an interrupted run loses nothing finished
+            manifest.write(json.dumps(record) + "\n")
+            manifest.flush()
+            if "error" in record:
+                n_failed += 1
+                print(f"[{i}/{len(todo)}] {record['path']}: {record['error']}", file=sys.stderr)
+            else:
+                n_ok += 1
+                audio_s += record.get("duration_s", 0.0)
+            if i % 100 == 0 or i == len(todo):
+                elapsed = time.perf_counter() - start
+                print(f"[{i}/{len(todo)}] {i / elapsed:.1f} files/s, "
+                      f"{audio_s / elapsed:.1f}x real time, {n_failed} failed")
+
+    print(f"Done: {n_ok} processed, {n_failed} failed in {time.perf_counter() - start:.1f}s "
+          f"with {workers} workers × {intra_op_threads} threads")
+
+
+if __name__ == "__main__":
+    main()
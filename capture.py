@@ -0,0 +1,271 @@
+"""
+Live audio capture that keeps the PortAudio callback cheap.
+
+The real-time callback only copies each block into a preallocated ring
+buffer. A separate writer thread drains the ring in batches, writes them to
+the WAV file and hands them to any other consumers (e.g. streaming
+enhancement). Overruns reported by PortAudio and frames dropped because the
+ring was full are counted instead of printed from the callback.
+
+`SimulatedInputStream` replays a file or array through the same callback
+interface as `sounddevice.InputStream`, so capture can run without a mic.
+"""
+import sys
+import time
+import wave
+import threading
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Preallocated single-producer / single-consumer ring of float32 frames.
+
+    The producer only advances `written` and the consumer only advances
+    `read_count`; each counter has a single writer, so neither side needs a
+    lock. When the ring is full, new frames are dropped rather than
+    overwriting unread ones.
+    """
+
+    def __init__(self, capacity, channels=1):
+        self.capacity = int(capacity)
+        self.channels = channels
+        self._data = np.zeros((self.capacity, channels), dtype=np.float32)
+        self.written = 0        # total frames ever written (producer-owned)
+        self.read_count = 0     # total frames ever read (consumer-owned)
+
+    def available(self):
+        return self.written - self.read_count
+
+    def write(self, block):
+        """
+        Copy `block` (frames × channels) into the ring; returns how many
+        frames fit.
+        """
+        n = min(len(block), self.capacity - self.available())
+        if n <= 0:
+            return 0
+        start = self.written % self.capacity
+        first = min(n, self.capacity - start)
+        self._data[start:start + first] = block[:first]
+        if n > first:
+            self._data[:n - first] = block[first:n]
+        self.written += n
+        return n
+
+    def read(self, max_frames=None):
+        """
+        Remove and return up to `max_frames` unread frames (a copy).
+        """
+        n = self.available()
+        if max_frames is not None:
+            n = min(n, max_frames)
+        start = self.read_count % self.capacity
+        idx = (start + np.arange(n)) % self.capacity
+        out = self._data[idx]
+        self.read_count += n
+        return out
+
+    def latest(self, n):
+        """
+        Peek at the most recent `n` frames without consuming them (for plotting).
+        """
+        n = min(n, self.written, self.capacity)
+        idx = (self.written - n + np.arange(n)) % self.capacity
+        return self._data[idx]
+
+
+class Capture:
+    """
+    Record from an input stream into a 16-bit WAV file via a ring buffer.
+
+    Args:
+        filename (str): Output WAV path (None to skip writing)
+        samplerate (int): Capture sample rate
+        channels (int): Number of input channels
+        blocksize (int): Frames per callback
+        buffer_s (float): Ring capacity in seconds
+        write_interval (float): How often the writer thread drains the ring
+        consumers (list): Callables that also receive each drained batch
+        stream_factory (callable): Builds the input stream (default: sounddevice.InputStream)
+    """
+
+    def __init__(self, filename, samplerate=44100, channels=1, blocksize=1024, buffer_s=10.0,
+                 write_interval=0.1, consumers=None, stream_factory=None):
+        self.filename = filename
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.write_interval = write_interval
+        self.consumers = list(consumers or [])
+        self.ring = RingBuffer(int(buffer_s * samplerate), channels)
+        self.overruns = 0           # input overflows reported by the audio driver
+        self.dropped_frames = 0     # frames lost because the ring was full
+        self.frames_written = 0
+        self._stream_factory = stream_factory
+        self._stream = None
+        self._stop = threading.Event()
+        self._writer_thread = None
+
+    def _callback(self, indata, frames, time_info, status):
+        # Runs on the real-time audio thread: no I/O, no allocation beyond the copy
+        if status and getattr(status, "input_overflow", False):
+            self.overruns += 1
+        self.dropped_frames += frames - self.ring.write(indata)
+
+    def _drain(self, wf):
+        block = self.ring.read()
+        if len(block) == 0:
+            return
+        if wf is not None:
+            pcm = np.int16(np.clip(block, -1.0, 1.0) * 32767)
+            wf.writeframes(pcm.tobytes())
+        self.frames_written += len(block)
+        for consumer in self.consumers:
+            consumer(block)
+
+    def _writer(self):
+        wf = None
+        if self.filename:
+            wf = wave.open(self.filename, 'wb')
+            wf.setnchannels(self.channels)
+            wf.setsampwidth(2)          # 16-bit
+            wf.setframerate(self.samplerate)
+        try:
+            while not self._stop.wait(self.write_interval):
+                self._drain(wf)
+            self._drain(wf)     # whatever arrived before the stream stopped
+        finally:
+            if wf is not None:
+                wf.close()
+
+    def start(self):
+        factory = self._stream_factory
+        if factory is None:
+            import sounddevice as sd
+            factory = sd.InputStream
+        self._stop.clear()
+        self._writer_thread = threading.Thread(target=self._writer, name="capture-writer", daemon=True)
+        self._writer_thread.start()
+        self._stream = factory(channels=self.channels, samplerate=self.samplerate,
+                               blocksize=self.blocksize, dtype='float32', callback=self._callback)
+        self._stream.start()
+        return self
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+        if self._writer_thread is not None:
+            self._stop.set()
+            self._writer_thread.join()
+            self._writer_thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        return {
+            "frames_captured": self.ring.written,
+            "frames_written": self.frames_written,
+            "dropped_frames": self.dropped_frames,
+            "overruns": self.overruns,
+        }
+
+
+class _SimulatedStatus:
+    def __init__(self, input_overflow):
+        self.input_overflow = input_overflow
+
+    def __bool__(self):
+        return self.input_overflow
+
+
+class SimulatedInputStream:
+    """
+    Stand-in for `sounddevice.InputStream` that plays `source` (a path or an
+    array) through the callback, block by block, paced at real time unless
+    `realtime=False`. If the callback falls more than one block behind real
+    time, the next call reports an input overflow like PortAudio would.
+    """
+
+    def __init__(self, source, samplerate, blocksize, channels=1, dtype='float32', callback=None,
+                 realtime=True, loop=False):
+        if isinstance(source, str):
+            from audio_utils import load_audio
+            source = load_audio(source, samplerate)
+        source = np.asarray(source, dtype=np.float32)
+        if source.ndim == 1:
+            source = np.repeat(source[:, np.newaxis], channels, axis=1)
+        self.source = source
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.callback = callback
+        self.realtime = realtime
+        self.loop = loop
+        self.finished = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def active(self):
+        return self._thread is not None and not self.finished.is_set()
+
+    def _run(self):
+        period = self.blocksize / self.samplerate
+        next_due = time.perf_counter()
+        pos = 0
+        while not self._stop.is_set():
+            if pos >= len(self.source):
+                if not self.loop:
+                    break
+                pos = 0
+            block = self.source[pos:pos + self.blocksize]
+            if len(block) < self.blocksize:
+                block = np.pad(block, ((0, self.blocksize - len(block)), (0, 0)))
+            pos += self.blocksize
+
+            late = self.realtime and time.perf_counter() - next_due > period
+            self.callback(block, self.blocksize, None, _SimulatedStatus(late))
+
+            if self.realtime:
+                next_due += period
+                time.sleep(max(0.0, next_due - time.perf_counter()))
+        self.finished.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="simulated-input", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def close(self):
+        pass
+
+
+def simulated_stream_factory(source, realtime=True, loop=False):
+    """
+    A `stream_factory` for `Capture` that replays `source` instead of the mic.
+    """
+    def factory(**kwargs):
+        return SimulatedInputStream(source, realtime=realtime, loop=loop, **kwargs)
+    return factory
+
+
+if __name__ == "__main__":
+    # python capture.py input.wav [output.wav]  – replay a file through the capture path and print counters
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python capture.py input.wav [output.wav]")
+        sys.exit(1)
+    output = sys.argv[2] if len(sys.argv) == 3 else None
+    capture = Capture(output, samplerate=44100, stream_factory=simulated_stream_factory(sys.argv[1]))
+    with capture:
+        capture._stream.finished.wait()
+    print(capture.stats())
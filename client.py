@@ -0,0 +1,100 @@
+"""
+Thin client for the inference service in server.py.
+
+Uses only the standard library, so the app and scripts do not need aiohttp.
+Set VOICE_AUTH_SERVER (e.g. http://127.0.0.1:8765) and `get_client()` returns
+a client; the app and `pipeline.default_stages()` then send transcription,
+embedding, verification and phrase checks to the server instead of loading
+the models.
+"""
+import os
+import json
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+from audio_utils import load_audio
+
+SR = 16000
+SERVER_ENV = "VOICE_AUTH_SERVER"
+
+
+class ServerBusy(Exception):
+    """
+    The server kept refusing the request because its queue was full.
+    """
+
+
+class InferenceClient:
+    """
+    Call the server with the same signatures as the local functions.
+
+    Args:
+        base_url (str): e.g. "http://127.0.0.1:8765"
+        timeout (float): Seconds to wait for a reply
+        retries (int): How many times to retry a 503 (queue full) after its Retry-After
+    """
+
+    def __init__(self, base_url, timeout=60.0, retries=3):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+
+    def _post(self, op, audio, sr, **params):
+        # Resample on the client: it is cheap here and keeps request bodies small
+        clip = load_audio(audio, SR, orig_sr=sr)
+        query = urllib.parse.urlencode(dict(params, sr=SR))
+        body = np.ascontiguousarray(clip, dtype="<f4").tobytes()
+        for attempt in range(self.retries + 1):
+            request = urllib.request.Request(f"{self.base_url}/{op}?{query}", data=body, method="POST",
+                                             headers={"Content-Type": "application/octet-stream"})
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    return json.loads(response.read())
+            except urllib.error.HTTPError as e:
+                if e.code != 503 or attempt == self.retries:
+                    detail = e.read().decode("utf-8", "replace")
+                    if e.code == 503:
+                        raise ServerBusy(detail) from e
+                    raise RuntimeError(f"{op} failed with HTTP {e.code}: {detail}") from e
+                time.sleep(float(e.headers.get("Retry-After", 1)))
+
+    def transcribe(self, audio, sr=SR):
+        return self._post("transcribe", audio, sr)["text"]
+
+    def extract_embedding(self, audio, sr=SR):
+        """
+        Speaker embedding as a float32 NumPy vector.
+        """
+        return np.asarray(self._post("embedding", audio, sr)["embedding"], dtype=np.float32)
+
+    def verify_speakers(self, audio, speaker_db="speakers", threshold=0.7, sr=SR, top_k=1,
+                        search="exact", nprobe=8):
+        result = self._post("verify", audio, sr, speaker_db=speaker_db, threshold=threshold,
+                            top_k=top_k, search=search, nprobe=nprobe)
+        result["candidates"] = [tuple(c) for c in result["candidates"]]
+        return result
+
+    def verify_phrase(self, audio, phrases, sr=SR, threshold=None):
+        """
+        `functions.verify_phrase` on the server; None keeps its default threshold.
+        """
+        params = {"phrases": json.dumps(list(phrases))}
+        if threshold is not None:
+            params["threshold"] = threshold
+        return self._post("phrase", audio, sr, **params)
+
+    def health(self):
+        with urllib.request.urlopen(f"{self.base_url}/health", timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+def get_client():
+    """
+    An InferenceClient for $VOICE_AUTH_SERVER, or None to run models in-process.
+    """
+    url = os.environ.get(SERVER_ENV)
+    return InferenceClient(url) if url else None
@@ -0,0 +1,197 @@
+"""
+Continuous speaker verification over a live stream.
+
+`ContinuousVerifier` cuts overlapping windows from the incoming audio, embeds
+`batch_windows` of them per TitaNet forward pass and scores each against the
+claimed speaker's voiceprint. A rolling mean over the last `smooth_windows`
+scores drives the decision: when it drops below `threshold` a
+"speaker_change" event is raised, and "speaker_resumed" when it recovers.
+Silent windows are skipped so pauses do not look like a different speaker.
+
+Cost and delay are set by three knobs: the model runs 1 / `hop_s` windows
+per second of audio (in 1 / (`hop_s` * `batch_windows`) forward passes), and
+a change is reported at most `max_detection_delay_s` after it happens
+(plus any silence the new speaker leaves, since silent windows are skipped).
+
+    python continuous_verification.py session.wav --speaker alice
+    python continuous_verification.py session.wav --speaker alice --hop 1.0 --batch 8 --stub-models
+"""
+import argparse
+from collections import deque
+
+import numpy as np
+
+from vad import frame_energy_db
+
+
+def _unit(vec):
+    vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+class ContinuousVerifier:
+    """
+    Keep checking that the claimed speaker is the one talking.
+
+    Args:
+        voiceprint (np.ndarray): Claimed speaker's embedding
+        sr (int): Sample rate of the pushed blocks
+        window_s (float): Audio per embedding (TitaNet needs at least 1 s)
+        hop_s (float): Step between window starts; sets the windows embedded per second
+        batch_windows (int): Windows per batched forward pass
+        smooth_windows (int): Window scores in the rolling mean
+        threshold (float): Rolling cosine similarity below which the speaker has changed
+        silence_db (float): Windows quieter than this (RMS dBFS) are not scored
+        embed_fn (callable): (windows, sr) -> (n, dim) embeddings; defaults to
+            `Speaker_Authontication.extract_embeddings`
+    """
+
+    def __init__(self, voiceprint, sr=16000, window_s=1.5, hop_s=0.5, batch_windows=4, smooth_windows=3,
+                 threshold=0.6, silence_db=-45.0, embed_fn=None):
+        if window_s < 1.0:
+            raise ValueError("window_s must be at least 1 s for TitaNet")
+        self.voiceprint = _unit(voiceprint)
+        self.sr = sr
+        self.window = int(window_s * sr)
+        self.hop = int(hop_s * sr)
+        self.batch_windows = batch_windows
+        self.threshold = threshold
+        self.silence_db = silence_db
+        if embed_fn is None:
+            from Speaker_Authontication import extract_embeddings
+            embed_fn = lambda windows, sr: extract_embeddings(windows, sr=sr, batch_size=len(windows))
+        self.embed_fn = embed_fn
+
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = 0          # stream position (samples) of _buffer[0]
+        self._next_window = 0           # stream position of the next window to cut
+        self._pending = []              # (end position, samples) waiting for a full batch
+        self._recent = deque(maxlen=smooth_windows)
+        self.speaker_ok = True
+        self.scores = []                # (window end in seconds, score) for every scored window
+        self.forward_passes = 0
+
+    @classmethod
+    def for_speaker(cls, name, speaker_db="speakers", **kwargs):
+        """
+        Verifier for an enrolled speaker's stored voiceprint.
+        """
+        from speaker_index import get_index
+        store = get_index(speaker_db).store
+        store.refresh()
+        if name not in store:
+            raise KeyError(f"Speaker '{name}' is not enrolled in {speaker_db}")
+        return cls(store.mean(name), **kwargs)
+
+    @property
+    def windows_per_second(self):
+        return self.sr / self.hop
+
+    @property
+    def max_detection_delay_s(self):
+        """
+        Upper bound on the time between a change of speaker and its event
+        while the new speaker keeps talking (ignoring compute time): up to one
+        hop until the next window starts, then the new voice must fill that
+        window, the batch must fill up and the rolling mean must turn.
+        Windows skipped as silent are not counted, so pauses in the new
+        speaker's audio delay the event by as long as they last.
+        """
+        hops = 1 + (self.batch_windows - 1) + (self._recent.maxlen - 1)
+        return (self.window + hops * self.hop) / self.sr
+
+    @property
+    def rolling_score(self):
+        return float(np.mean(self._recent)) if self._recent else None
+
+    def push(self, block):
+        """
+        Feed captured samples; returns the events raised by any batch that ran.
+        """
+        block = np.asarray(block, dtype=np.float32).reshape(-1)
+        self._buffer = np.concatenate([self._buffer, block])
+        stream_end = self._buffer_start + len(self._buffer)
+
+        while self._next_window + self.window <= stream_end:
+            start = self._next_window - self._buffer_start
+            window = self._buffer[start:start + self.window]
+            self._next_window += self.hop
+            if np.mean(frame_energy_db(window, self.sr)) > self.silence_db:
+                self._pending.append((self._next_window - self.hop + self.window, window))
+
+        # Keep only what the next windows still need
+        drop = self._next_window - self._buffer_start
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._buffer_start += drop
+
+        events = []
+        while len(self._pending) >= self.batch_windows:
+            events.extend(self._score(self._pending[:self.batch_windows]))
+            del self._pending[:self.batch_windows]
+        return events
+
+    def flush(self):
+        """
+        Score windows still waiting for a full batch (e.g. at the end of a session).
+        """
+        events = self._score(self._pending) if self._pending else []
+        self._pending = []
+        return events
+
+    def _score(self, batch):
+        embeddings = np.asarray(self.embed_fn(np.stack([w for _, w in batch]), self.sr), dtype=np.float32)
+        self.forward_passes += 1
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        events = []
+        for (end, _), score in zip(batch, embeddings @ self.voiceprint):
+            time_s = end / self.sr
+            self.scores.append((time_s, float(score)))
+            self._recent.append(float(score))
+            rolling = self.rolling_score
+            ok = rolling >= self.threshold
+            if ok != self.speaker_ok:
+                self.speaker_ok = ok
+                events.append({"type": "speaker_resumed" if ok else "speaker_change",
+                               "time_s": time_s, "rolling_score": rolling})
+        return events
+
+
+def verify_stream(blocks, verifier):
+    """
+    Push every block into `verifier` and yield its events as they happen.
+    """
+    for block in blocks:
+        yield from verifier.push(block)
+    yield from verifier.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio", help="Recording to replay as a live stream")
+    parser.add_argument("--speaker", required=True, help="Claimed (enrolled) speaker")
+    parser.add_argument("--speaker-db", default="speakers")
+    parser.add_argument("--window", type=float, default=1.5)
+    parser.add_argument("--hop", type=float, default=0.5)
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--realtime", action="store_true", help="Pace the replay at real time")
+    parser.add_argument("--stub-models", action="store_true", help="Use the NumPy embedding stand-in")
+    args = parser.parse_args()
+
+    from functions import file_stream
+    embed_fn = None
+    if args.stub_models:
+        from benchmarks.stubs import stub_embedding
+        embed_fn = lambda windows, sr: np.stack([stub_embedding(w, sr=sr) for w in windows])
+
+    verifier = ContinuousVerifier.for_speaker(args.speaker, args.speaker_db, window_s=args.window, hop_s=args.hop,
+                                              batch_windows=args.batch, threshold=args.threshold, embed_fn=embed_fn)
+    print(f"{verifier.windows_per_second:.1f} windows/s, detection delay ≤ {verifier.max_detection_delay_s:.1f}s")
+    for event in verify_stream(file_stream(args.audio, realtime=args.realtime), verifier):
+        print(f"{event['time_s']:7.2f}s  {event['type']}  (rolling score {event['rolling_score']:.2f})")
+    scores = [score for _, score in verifier.scores]
+    if scores:
+        print(f"{len(scores)} windows in {verifier.forward_passes} forward passes, "
+              f"mean score {np.mean(scores):.2f}, min {np.min(scores):.2f}")
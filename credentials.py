@@ -0,0 +1,146 @@
+"""
+Indexed credential store for manual login.
+
+Users live in a SQLite table keyed by username, so a login is one primary-key
+lookup regardless of how many users exist. Passwords are stored as salted
+PBKDF2-SHA256 hashes and compared in constant time; inserts are atomic and
+reject duplicate usernames.
+"""
+import csv
+import hmac
+import os
+import sqlite3
+import hashlib
+import secrets
+import threading
+
+PBKDF2_ITERATIONS = 200_000
+
+
+def hash_password(password, salt=None, iterations=PBKDF2_ITERATIONS):
+    """
+    Return (salt, PBKDF2-SHA256 hash) for `password`.
+    """
+    salt = salt if salt is not None else secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return salt, digest
+
+
+class CredentialStore:
+    """
+    Username → salted password hash, backed by a SQLite database file.
+    """
+
+    def __init__(self, db_path="speakers/users.db"):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                " username TEXT PRIMARY KEY,"
+                " salt BLOB NOT NULL,"
+                " password_hash BLOB NOT NULL,"
+                " iterations INTEGER NOT NULL)"
+            )
+        # Verified against when the username is unknown, so a miss costs the same as a hit
+        self._dummy = hash_password("", salt=b"\0" * 16)
+
+    def _conn(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            self._local.conn = conn
+        return conn
+
+    def add_user(self, username, password):
+        """
+        Add a user. Returns False if the username is already taken.
+        """
+        salt, digest = hash_password(password)
+        try:
+            with self._conn() as conn:
+                conn.execute(
+                    "INSERT INTO users (username, salt, password_hash, iterations) VALUES (?, ?, ?, ?)",
+                    (username, salt, digest, PBKDF2_ITERATIONS),
+                )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def verify(self, username, password):
+        """
+        True if `password` matches the stored hash for `username`.
+        """
+        row = self._conn().execute(
+            "SELECT salt, password_hash, iterations FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        salt, stored, iterations = row if row else (*self._dummy, PBKDF2_ITERATIONS)
+        _, digest = hash_password(password, salt=salt, iterations=iterations)
+        return hmac.compare_digest(digest, stored) and row is not None
+
+    def __contains__(self, username):
+        return self._conn().execute(
+            "SELECT 1 FROM users WHERE username = ?", (username,)
+        ).fetchone() is not None
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def migrate_csv(self, csv_path):
+        """
+        Import a legacy `username,password` CSV in one transaction.
+        The first row for a username wins, as with the old pandas lookup.
+        Returns the number of users added.
+        """
+        rows = {}
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            for record in csv.DictReader(f):
+                username = (record.get("username") or "").strip()
+                password = (record.get("password") or "").strip()
+                if username and password and username not in rows:
+                    rows[username] = password
+
+        with self._conn() as conn:
+            existing = {name for (name,) in conn.execute("SELECT username FROM users")}
+            new_rows = [(name, *hash_password(pw), PBKDF2_ITERATIONS)
+                        for name, pw in rows.items() if name not in existing]
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO users (username, salt, password_hash, iterations) VALUES (?, ?, ?, ?)",
+                new_rows,
+            )
+        return max(cursor.rowcount, 0)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_credential_store(manual_csv="speakers/users.csv"):
+    """
+    Return the store that replaces `manual_csv` (same path, `.db` extension).
+    The first time the database is created, users from the CSV are migrated into it.
+    """
+    db_path = os.path.splitext(manual_csv)[0] + ".db"
+    with _stores_lock:
+        if db_path not in _stores:
+            is_new = not os.path.exists(db_path)
+            store = CredentialStore(db_path)
+            if is_new and os.path.exists(manual_csv):
+                added = store.migrate_csv(manual_csv)
+                print(f"Migrated {added} users from {manual_csv} to {db_path}")
+            _stores[db_path] = store
+        return _stores[db_path]
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python credentials.py migrate speakers/users.csv
+    if len(sys.argv) != 3 or sys.argv[1] != "migrate":
+        print("Usage: python credentials.py migrate <users.csv>")
+        sys.exit(1)
+    csv_path = sys.argv[2]
+    store = CredentialStore(os.path.splitext(csv_path)[0] + ".db")
+    print(f"Migrated {store.migrate_csv(csv_path)} users to {store.db_path}")
@@ -0,0 +1,205 @@
+"""
+Speech-enhancement backends behind one interface.
+
+Every backend takes a mono buffer plus its sample rate and returns
+(enhanced samples, sample rate). The underlying models are loaded once per
+process through `models.get`, so no backend pays a model load per file.
+`select_backend` picks the best backend whose measured real-time factor
+fits a per-request latency budget.
+"""
+import json
+import os
+import tempfile
+import numpy as np
+import torch
+
+import models
+from audio_utils import load_audio, save_audio
+
+# Real-time factors measured on this machine by `python -m benchmarks.enhancement`
+RTF_TABLE_PATH = "enhancement_rtf.json"
+
+
+def _to_mono(enhanced_audio):
+    """
+    Flatten model output to a 1-D float32 array in [-1, 1].
+    """
+    enhanced_audio = np.asarray(enhanced_audio)
+    # Handle the (1, samples) / (samples, 1) formats the models return
+    if enhanced_audio.ndim == 3:
+        enhanced_audio = enhanced_audio[0]
+    if enhanced_audio.ndim == 2 and 1 in enhanced_audio.shape:
+        audio = enhanced_audio.reshape(-1)
+    elif enhanced_audio.ndim == 2:
+        # Take first channel if multiple channels
+        audio = enhanced_audio[0, :]
+    else:
+        audio = enhanced_audio
+
+    # Ensure audio is float32 and in the right range
+    audio = audio.astype('float32', copy=False)
+    peak = np.max(np.abs(audio)) if audio.size else 0.0
+    if peak > 1.0:
+        audio = audio / peak
+    return audio
+
+
+class EnhancementBackend:
+    """
+    Base class: subclasses set `name`, `model_name`, `native_sr` and implement `_enhance`.
+    """
+    name = None
+    model_name = None       # key in the model registry
+    native_sr = None        # rate the model runs at; input is resampled to it
+    expected_rtf = None     # rough CPU estimate, used until a measured RTF exists
+
+    def load(self):
+        if self.model_name:
+            models.get(self.model_name)
+
+    def enhance(self, audio, sr=16000):
+        """
+        Enhance `audio` recorded at `sr`; returns (float32 samples, sample rate).
+        """
+        audio = load_audio(audio, self.native_sr or sr, orig_sr=sr)
+        return _to_mono(self._enhance(audio)), self.native_sr or sr
+
+    def _enhance(self, audio):
+        raise NotImplementedError
+
+
+class ClearVoiceBackend(EnhancementBackend):
+    """
+    ClearVoice MossFormer2_SE_48K, for full-band input.
+    """
+    name = "clearvoice"
+    model_name = "clearvoice"
+    native_sr = 48000
+    expected_rtf = 0.6
+
+    def _enhance(self, audio):
+        myClearVoice = models.get(self.model_name)
+        try:
+            from clearvoice.utils.decode import decode_one_audio
+            speech_model = myClearVoice.models[0]
+        except (ImportError, AttributeError, IndexError):
+            # ClearVoice builds without the in-memory decoder only accept a path
+            tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
+            tmp.close()
+            try:
+                save_audio(tmp.name, audio, self.native_sr)
+                return myClearVoice(input_path=tmp.name, online_write=False)
+            finally:
+                os.remove(tmp.name)
+
+        with torch.no_grad():
+            return decode_one_audio(speech_model.model, speech_model.device,
+                                    audio[np.newaxis, :], speech_model.args)
+
+
+class ClearVoice16kBackend(ClearVoiceBackend):
+    """
+    ClearVoice MossFormerGAN_SE_16K: runs at the rate the app records and
+    the ASR/speaker models use, so 16 kHz audio is never resampled.
+    """
+    name = "clearvoice16k"
+    model_name = "clearvoice16k"
+    native_sr = 16000
+    expected_rtf = 0.3
+
+
+class DeepFilterNetBackend(EnhancementBackend):
+    """
+    DeepFilterNet3 through its Python API (instead of one `deepFilter` CLI process per file).
+    """
+    name = "deepfilternet"
+    model_name = "deepfilternet"
+    native_sr = 48000
+    expected_rtf = 0.15
+
+    def _enhance(self, audio):
+        from df.enhance import enhance
+        model, df_state = models.get(self.model_name)
+        with torch.no_grad():
+            return enhance(model, df_state, torch.from_numpy(audio).unsqueeze(0)).cpu().numpy()
+
+
+class DenoiserBackend(EnhancementBackend):
+    """
+    Facebook Demucs denoiser (dns64), non-commercial licence.
+    """
+    name = "dns64"
+    model_name = "dns64"
+    native_sr = 16000
+    expected_rtf = 0.2
+
+    def _enhance(self, audio):
+        model = models.get(self.model_name)
+        with torch.no_grad():
+            return model(torch.from_numpy(audio).float().unsqueeze(0)).cpu().numpy()
+
+
+class PassthroughBackend(EnhancementBackend):
+    """
+    No enhancement; the fallback when no model fits the latency budget.
+    """
+    name = "none"
+    expected_rtf = 0.0
+
+    def _enhance(self, audio):
+        return audio
+
+
+# Best quality first; `select_backend` walks this list
+BACKENDS = {backend.name: backend for backend in [
+    ClearVoiceBackend(),
+    ClearVoice16kBackend(),
+    DeepFilterNetBackend(),
+    DenoiserBackend(),
+    PassthroughBackend(),
+]}
+
+
+def get_backend(name):
+    if name not in BACKENDS:
+        raise KeyError(f"Unknown enhancement backend '{name}'. Available: {list(BACKENDS)}")
+    return BACKENDS[name]
+
+
+def _native_first(names, sr):
+    # Stable reorder: backends that run at `sr` natively (no resampling) come first
+    return sorted(names, key=lambda name: BACKENDS[name].native_sr != sr) if sr else list(names)
+
+
+def native_backend(sr, candidates=None):
+    """
+    The best backend that runs at `sr` without resampling, or the best
+    backend overall if none does.
+    """
+    names = [name for name in candidates or BACKENDS if name != "none"]
+    return BACKENDS[_native_first(names, sr)[0]]
+
+
+def load_rtf_table(path=RTF_TABLE_PATH):
+    """
+    Measured real-time factors by backend name ({} if not benchmarked yet).
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {name: row["rtf"] for name, row in json.load(f).get("backends", {}).items()}
+
+
+def select_backend(duration_s, latency_budget_s, rtf_table=None, candidates=None, sr=None):
+    """
+    Return the highest-quality backend expected to enhance `duration_s`
+    seconds of audio within `latency_budget_s`. With `sr`, backends that
+    run natively at that rate are preferred.
+    """
+    rtf_table = load_rtf_table() if rtf_table is None else rtf_table
+    for name in _native_first(candidates or BACKENDS, sr):
+        backend = BACKENDS[name]
+        rtf = rtf_table.get(name, backend.expected_rtf)
+        if rtf is not None and rtf * duration_s <= latency_budget_s:
+            return backend
+    return BACKENDS["none"]
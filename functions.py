@@ -1,55 +1,463 @@
-# functions.py
 import os
+import re
+import sys
+import time
+import queue
+import threading
 import torch
-import librosa
-from transformers import WhisperForConditionalGeneration, WhisperProcessor
+import numpy as np
+
+import models
+from audio_utils import load_audio
+from credentials import get_credential_store
+from tracing import span, count
 
 #Speaker Database
 user_csv = "speakers/users.csv"
 
+# Whisper works on 16 kHz audio
+SR = 16000
+
+
+
+# ── Whisper short-utterance fast path ─────────────────────────────────
+
+# Whisper writes at most ~5 tokens per second of fast English speech; the
+# cap stops a hallucinating decoder from running to the 448-token limit
+MAX_TOKENS_PER_SECOND = 8
+MIN_NEW_TOKENS = 16
+WHISPER_MAX_NEW_TOKENS = 440        # 448 decoder positions minus the 4 prompt tokens
+# A single clip up to this long decodes into a preallocated static KV cache
+# that is reset and reused by the next call instead of being grown token by
+# token. Batches (e.g. the server's micro-batches) decode with a dynamic cache
+# so only one static cache is ever held per model
+FAST_PATH_MAX_S = 10.0
+PROMPT_TOKENS = 4                   # <|startoftranscript|><|en|><|transcribe|><|notimestamps|>
+
+_kv_cache_lock = threading.Lock()   # one call at a time may use the shared cache
+_buffers = threading.local()
+
 
-# Cache the model & processor at import time
-model = WhisperForConditionalGeneration.from_pretrained("openai/whisper-tiny")
-processor = WhisperProcessor.from_pretrained("openai/whisper-tiny")
+def _supports_static_cache(model):
+    # transformers 4.x flags it per model; 5.x on every compilable model.
+    # ONNX Runtime builds have neither
+    return bool(getattr(model, "_supports_static_cache", getattr(model, "_can_compile_fullgraph", False)))
 
-def transcribe(audio_path: str) -> str:
+
+def _static_kv_cache(model):
     """
-    Load an audio file and return Whisper’s transcription.
+    The fast path's batch-of-one decoder self-attention + cross-attention
+    cache, allocated on first use and reset afterwards. It is kept on the
+    model, so it goes away when models.py unloads the model.
     """
-    # 1. Load & resample
-    speech, sr = librosa.load(audio_path, sr=16000)
-    # 2. Feature-extract
-    inputs = processor.feature_extractor(
-        speech, sampling_rate=16000, return_tensors="pt"
+    cache = model.__dict__.get("_voice_auth_kv_cache")
+    if cache is not None:
+        cache.reset()
+        return cache
+
+    from transformers import StaticCache, EncoderDecoderCache
+
+    def static(length):
+        # max_batch_size/device/dtype are needed by transformers 4.x and ignored by 5.x
+        return StaticCache(config=model.config, max_cache_len=length, max_batch_size=1,
+                           device=model.device, dtype=model.dtype)
+
+    cache = model.__dict__["_voice_auth_kv_cache"] = EncoderDecoderCache(
+        static(PROMPT_TOKENS + _max_new_tokens(FAST_PATH_MAX_S)),
+        static(model.config.max_source_positions),
     )
-    attention_mask = torch.ones_like(inputs["input_features"]).long()
-    # 3. Inference
-    with torch.no_grad():
-        predicted_ids = model.generate(
-            inputs["input_features"],
-            attention_mask=attention_mask,
-            language="en",
-        )
-    # 4. Decode and return
+    return cache
+
+
+def _max_new_tokens(seconds):
+    """
+    Decoding budget for the longest clip of a batch.
+    """
+    return int(min(WHISPER_MAX_NEW_TOKENS, MIN_NEW_TOKENS + MAX_TOKENS_PER_SECOND * seconds))
+
+
+def _buffer(name, shape, dtype=torch.float32, fill=None):
+    """
+    Per-thread tensor reused while calls ask for the same shape; only the
+    latest shape is kept.
+    """
+    tensor = getattr(_buffers, name, None)
+    if tensor is None or tuple(tensor.shape) != shape:
+        tensor = torch.empty(shape, dtype=dtype)
+        if fill is not None:
+            tensor.fill_(fill)
+        setattr(_buffers, name, tensor)
+    return tensor
+
+
+def _log_mel(speeches, feature_extractor):
+    """
+    Whisper's log-mel input features for a list of 16 kHz clips.
+
+    The encoder always takes the full 30 s (3000 frame) window, but the
+    frames past the end of the audio are silence, which Whisper's
+    normalisation maps to one constant per clip. Only the audio itself (plus
+    one FFT window of zeros) goes through the STFT; the rest of the reused
+    output buffer is filled with that constant. The result matches
+    `feature_extractor(...)` up to float rounding.
+    """
+    fe = feature_extractor
+    clips = [np.asarray(speech, dtype=np.float32)[:fe.n_samples] for speech in speeches]
+    length = min(max(len(clip) for clip in clips) + fe.n_fft, fe.n_samples)
+    wave = torch.zeros((len(clips), length))
+    for row, clip in enumerate(clips):
+        wave[row, :len(clip)] = torch.from_numpy(clip)
+
+    window = _buffer("hann", (fe.n_fft,))
+    if not hasattr(_buffers, "mel_filters"):
+        window.copy_(torch.hann_window(fe.n_fft))
+        _buffers.mel_filters = torch.from_numpy(np.asarray(fe.mel_filters, dtype=np.float32)).T
+    stft = torch.stft(wave, fe.n_fft, fe.hop_length, window=window, return_complex=True)
+    power = stft[..., :-1].abs() ** 2
+    log_spec = torch.clamp(_buffers.mel_filters @ power, min=1e-10).log10()
+
+    # Same dynamic-range floor as Whisper: 8 (log10) below each clip's peak
+    floor = log_spec.amax(dim=(1, 2), keepdim=True) - 8.0
+    features = _buffer("features", (len(clips), fe.feature_size, fe.nb_max_frames))
+    features.copy_(torch.clamp(floor, min=-10.0).expand_as(features))      # log10(1e-10) = -10 is silence
+    features[..., :log_spec.shape[-1]] = torch.maximum(log_spec, floor)
+    return features.add_(4.0).div_(4.0)
+
+
+def _transcribe_arrays(speeches, fast=True):
+    """
+    Run Whisper on a list of mono 16 kHz float arrays in a single
+    `generate` call and return one text per array, in order.
+
+    With `fast` (the default) the features are computed over the audio
+    only, decoding is capped at `_max_new_tokens` of the longest clip and
+    a single short clip reuses a preallocated static KV cache.
+    `fast=False` is the plain padded-window path, kept for benchmarking.
+    """
+    model, processor = models.get(models.variant("whisper"))
+    longest_s = max(len(speech) for speech in speeches) / SR
+    # 1. Feature-extract
+    with span("feature_extraction"):
+        if fast:
+            features = _log_mel(speeches, processor.feature_extractor)
+        else:
+            features = processor.feature_extractor(
+                speeches, sampling_rate=SR, return_tensors="pt"
+            )["input_features"]
+    attention_mask = _buffer("attention_mask", tuple(features.shape), torch.long, fill=1)
+
+    # 2. Inference. The language and task are fixed, so Whisper never runs
+    # language detection; the prompt is always <|en|><|transcribe|>
+    kwargs = {"language": "en", "task": "transcribe"}
+    if fast:
+        kwargs["max_new_tokens"] = _max_new_tokens(longest_s)
+    # A concurrent call finds the cache in use and decodes with a dynamic one
+    static = (fast and len(speeches) == 1 and longest_s <= FAST_PATH_MAX_S
+              and _supports_static_cache(model)
+              and _kv_cache_lock.acquire(blocking=False))
+    try:
+        if static:
+            kwargs["past_key_values"] = _static_kv_cache(model)
+        with span("generate"), torch.no_grad():
+            predicted_ids = model.generate(features, attention_mask=attention_mask, **kwargs)
+    finally:
+        if static:
+            _kv_cache_lock.release()
+    # 3. Decode and return
     return processor.tokenizer.batch_decode(
         predicted_ids, skip_special_tokens=True
-    )[0]
+    )
 
 
-def manual_authentication(user_name, user_password, manual_csv=user_csv):
+def _transcribe_array(speech):
     """
-    Authenticate a user based on a manual CSV file.
+    Run Whisper on a mono 16 kHz float array and return the text.
+    """
+    return _transcribe_arrays([speech])[0]
+
+
+def transcribe(audio, sr=SR) -> str:
+    """
+    Return Whisper’s transcription of an audio file or an in-memory buffer
+    recorded at `sr`.
+    """
+    return _transcribe_array(load_audio(audio, SR, orig_sr=sr))
+
+
+def transcribe_batch(audio_paths, batch_size=8):
     """
-    import pandas as pd
-    df = pd.read_csv(manual_csv)
+    Transcribe many audio files, `batch_size` clips per Whisper forward pass.
+
+    Args:
+        audio_paths (list): Paths to audio files
+        batch_size (int): Number of clips stacked into one `generate` call
+
+    Returns:
+        list: Transcriptions in the same order as `audio_paths`
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    texts = []
+    for start in range(0, len(audio_paths), batch_size):
+        batch = [load_audio(path, SR) for path in audio_paths[start:start + batch_size]]
+        texts.extend(_transcribe_arrays(batch))
+    return texts
+
+
+# ── Phrase verification ───────────────────────────────────────────────
+
+# Geometric-mean probability Whisper must give the phrase's tokens
+PHRASE_THRESHOLD = 0.4
+
+
+def _phrase_variants(phrases):
+    # Each phrase as written plus a capitalised, full-stopped form, which is
+    # how Whisper writes sentences; duplicates are scored once
+    variants = []
+    for phrase in phrases:
+        sentence = phrase.strip().rstrip(".!?")
+        for variant in (phrase.strip(), sentence[:1].upper() + sentence[1:] + "."):
+            if variant and variant not in variants:
+                variants.append(variant)
+    return variants
+
+
+def score_phrase(audio, phrases, sr=SR):
+    """
+    Score how well `audio` matches each expected phrase with one
+    teacher-forced Whisper pass instead of open-ended decoding.
+
+    All phrase variants are stacked into one decoder batch that shares a
+    single encoder pass over the clip.
 
-    if user_name in df['username'].values:
-        user_row = df[df['username'] == user_name]
-        stored_password = str(user_row['password'].values[0]).strip()
-        input_password = user_password.strip()
-        if stored_password == input_password:
-            return "VERIFIED"
+    Args:
+        audio (str | np.ndarray): Path, or samples recorded at `sr`
+        phrases (list): Accepted phrasings of the expected sentence
+        sr (int): Sample rate of an in-memory `audio`
+
+    Returns:
+        list: One dict per scored variant (best first) with the phrase,
+        mean token log-probability, confidence (geometric-mean token
+        probability) and the least likely token's probability
+    """
+    model, processor = models.get(models.variant("whisper"))
+    tokenizer = processor.tokenizer
+    speech = load_audio(audio, SR, orig_sr=sr)
+    with span("feature_extraction"):
+        features = _log_mel([speech], processor.feature_extractor)
+
+    variants = _phrase_variants(phrases)
+    tokenizer.set_prefix_tokens(language="en", task="transcribe", predict_timestamps=False)
+    prefix_len = len(tokenizer("").input_ids) - 1         # start/language/task tokens, without <|endoftext|>
+    sequences = [tokenizer(" " + variant).input_ids for variant in variants]
+    longest = max(len(ids) for ids in sequences)
+    ids = torch.full((len(sequences), longest), tokenizer.eos_token_id, dtype=torch.long)
+    mask = torch.zeros_like(ids)
+    for row, seq in enumerate(sequences):
+        ids[row, :len(seq)] = torch.tensor(seq)
+        mask[row, :len(seq)] = 1
+
+    with span("phrase_score"), torch.no_grad():
+        if hasattr(model, "get_encoder"):
+            hidden = model.get_encoder()(features).last_hidden_state
+            logits = model(encoder_outputs=(hidden.expand(len(sequences), -1, -1),),
+                           decoder_input_ids=ids, decoder_attention_mask=mask).logits
+        else:
+            # ONNX Runtime build: no separate encoder handle
+            logits = model(input_features=features.expand(len(sequences), -1, -1),
+                           decoder_input_ids=ids).logits
+
+    # Log-probability of each phrase token (and <|endoftext|>) given the ones before it
+    logprobs = torch.log_softmax(logits[:, :-1].float(), dim=-1)
+    token_logprobs = logprobs.gather(-1, ids[:, 1:, None])[..., 0]
+    scored = mask[:, 1:].clone()
+    scored[:, :prefix_len - 1] = 0          # forced prefix tokens are not evidence
+
+    results = []
+    for row, variant in enumerate(variants):
+        values = token_logprobs[row][scored[row].bool()]
+        mean = float(values.mean())
+        results.append({
+            "phrase": variant,
+            "mean_logprob": mean,
+            "confidence": float(np.exp(mean)),
+            "min_token_prob": float(values.min().exp()),
+        })
+    return sorted(results, key=lambda r: -r["mean_logprob"])
+
+
+def verify_phrase(audio, phrases, sr=SR, threshold=PHRASE_THRESHOLD):
+    """
+    Accept `audio` if its best-scoring phrase variant reaches `threshold`
+    confidence. Returns the best variant's scores plus "accepted".
+    """
+    best = score_phrase(audio, phrases, sr=sr)[0]
+    accepted = best["confidence"] >= threshold
+    count("phrase_checks", result="accepted" if accepted else "rejected")
+    return dict(best, accepted=accepted, threshold=threshold)
+
+
+# ── Streaming ─────────────────────────────────────────────────────────
+
+def mic_stream(duration=None, blocksize=1600):
+    """
+    Yield mono float32 blocks from the microphone until `duration` seconds
+    have been captured (or forever if None).
+    """
+    import sounddevice as sd
+
+    blocks = queue.Queue()
+
+    def callback(indata, frames, time_info, status):
+        if status:
+            print(status, file=sys.stderr)
+        blocks.put(indata[:, 0].copy())
+
+    with sd.InputStream(channels=1, samplerate=SR, blocksize=blocksize,
+                        dtype="float32", callback=callback):
+        captured = 0
+        while duration is None or captured < duration * SR:
+            block = blocks.get()
+            captured += len(block)
+            yield block
+
+
+def file_stream(audio_path, blocksize=1600, realtime=False):
+    """
+    File-backed stand-in for `mic_stream`: yields the file in blocks,
+    optionally paced at real time.
+    """
+    speech = load_audio(audio_path, SR)
+    for start in range(0, len(speech), blocksize):
+        if realtime:
+            time.sleep(blocksize / SR)
+        yield speech[start:start + blocksize]
+
+
+def _words(text):
+    return re.sub(r"[^\w\s']", "", text.lower()).split()
+
+
+def _merge_overlap(committed, new_text, max_words=8):
+    """
+    Append `new_text` to `committed`, dropping the words both windows heard
+    in their shared overlap.
+    """
+    if not committed:
+        return new_text.strip()
+    old, new = _words(committed), _words(new_text)
+    pieces = new_text.split()
+    for k in range(min(len(old), len(new), max_words), 0, -1):
+        if old[-k:] == new[:k]:
+            pieces = pieces[k:]
+            break
+    return " ".join([committed.strip()] + pieces).strip()
+
+
+def transcribe_stream(blocks, window_s=5.0, overlap_s=1.0, step_s=1.0):
+    """
+    Incrementally transcribe an iterable of 16 kHz audio blocks.
+
+    Audio is cut into `window_s` windows that overlap by `overlap_s`. Every
+    `step_s` seconds of new audio the open window is decoded and a partial
+    result is yielded; once the stream ends a final result is yielded.
+    Whisper never sees more than one window at a time, so time-to-first-text
+    depends on `step_s` and `window_s`, not on the length of the recording.
+
+    Args:
+        blocks (iterable): Mono float32 blocks, e.g. from `mic_stream` or `file_stream`
+        window_s (float): Length of each decoded window in seconds
+        overlap_s (float): Overlap between consecutive windows in seconds
+        step_s (float): How often to emit a partial transcript in seconds
+
+    Yields:
+        dict: {"text": transcript so far, "final": bool}
+    """
+    window = int(window_s * SR)
+    hop = window - int(overlap_s * SR)
+    step = int(step_s * SR)
+    if hop <= 0:
+        raise ValueError("overlap_s must be shorter than window_s")
+
+    buf = np.zeros(0, dtype=np.float32)
+    committed = ""
+    heard = 0       # samples at the start of `buf` already covered by a closed window
+    pending = 0
+
+    for block in blocks:
+        buf = np.concatenate([buf, np.asarray(block, dtype=np.float32).reshape(-1)])
+        pending += len(block)
+
+        # Close every full window and keep its tail as overlap for the next one
+        while len(buf) >= window:
+            committed = _merge_overlap(committed, _transcribe_array(buf[:window]))
+            buf = buf[hop:]
+            heard = window - hop
+            pending = 0
+            yield {"text": committed, "final": False}
+
+        if pending >= step:
+            pending = 0
+            yield {"text": _merge_overlap(committed, _transcribe_array(buf)), "final": False}
+
+    # Whatever is left past the last full window
+    if len(buf) > heard:
+        committed = _merge_overlap(committed, _transcribe_array(buf))
+    yield {"text": committed, "final": True}
+
+
+def manual_authentication(user_name, user_password, manual_csv=user_csv):
+    """
+    Authenticate a user against the credential store that replaces `manual_csv`.
+    """
+    store = get_credential_store(manual_csv)
+    if store.verify(user_name.strip(), user_password.strip()):
+        return "VERIFIED"
     return "REJECTED"
 
 
+def add_manual_user(user_name, user_password, manual_csv=user_csv):
+    """
+    Register a password user. Returns False if the username is taken.
+    """
+    return get_credential_store(manual_csv).add_user(user_name.strip(), user_password.strip())
+
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+
+    parser = argparse.ArgumentParser(description="Batch-transcribe audio files with Whisper.")
+    parser.add_argument("inputs", nargs="+", help="Audio files or directories of .wav files")
+    parser.add_argument("--batch-size", type=int, default=8, help="Clips per Whisper forward pass")
+    parser.add_argument("--output", help="Write 'path<TAB>text' lines here instead of stdout")
+    parser.add_argument("--server", default=os.environ.get("VOICE_AUTH_SERVER"),
+                        help="Send the clips to this inference server (default: $VOICE_AUTH_SERVER)")
+    args = parser.parse_args()
+
+    paths = []
+    for item in args.inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(glob.glob(os.path.join(item, "*.wav"))))
+        else:
+            paths.append(item)
+
+    if args.server:
+        from concurrent.futures import ThreadPoolExecutor
+        from client import InferenceClient
+
+        # Keep a batch worth of requests in flight so the server can batch them
+        remote = InferenceClient(args.server)
+        with ThreadPoolExecutor(max_workers=args.batch_size) as pool:
+            texts = list(pool.map(remote.transcribe, paths))
+    else:
+        texts = transcribe_batch(paths, batch_size=args.batch_size)
 
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for path, text in zip(paths, texts):
+            out.write(f"{path}\t{text.strip()}\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
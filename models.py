@@ -0,0 +1,380 @@
+"""
+Process-wide registry of the heavy models.
+
+Nothing is loaded at import time: each model is built the first time
+`get(name)` asks for it and then shared by every caller in the process.
+`warm_up()` loads models ahead of the first request and `load_times()`
+reports how long each one took.
+
+With a memory budget (VOICE_AUTH_MODEL_BUDGET_MB or `set_memory_budget()`),
+the registry records how much resident memory each model added when it was
+loaded and, before a load would push the process RSS past the budget,
+unloads the least recently used models. An unloaded model is simply loaded
+again by the next `get`; `stats()` reports hits, misses, evictions and the
+reload latencies this costs.
+"""
+import gc
+import os
+import contextlib
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+from tracing import span, count
+
+_loaders = {}        # name -> zero-argument callable that builds the model
+_models = {}         # name -> loaded model
+_load_times = {}     # name -> seconds spent in the loader
+_locks = {}          # name -> lock so concurrent callers load a model only once
+_registry_lock = threading.Lock()
+
+_budget_mb = float(os.environ.get("VOICE_AUTH_MODEL_BUDGET_MB", "0"))     # 0 = no budget
+_recent = OrderedDict()     # loaded model names, least recently used first
+_sizes_mb = {}              # name -> RSS the last load of the model added
+_stats = {}                 # name -> {"hits", "misses", "evictions", "reload_s"}
+_memory_lock = threading.Lock()     # one load or eviction at a time while a budget is set
+
+
+def register(name, loader):
+    """
+    Register a zero-argument `loader` that builds the model called `name`.
+    """
+    with _registry_lock:
+        _loaders[name] = loader
+        _locks.setdefault(name, threading.Lock())
+        _stats.setdefault(name, {"hits": 0, "misses": 0, "evictions": 0, "reload_s": []})
+
+
+def get(name):
+    """
+    Return the model called `name`, loading it on first use (or again after
+    it was unloaded to stay within the memory budget).
+    """
+    model = _models.get(name)
+    if model is not None:
+        _stats[name]["hits"] += 1
+        count("model_cache", model=name, result="hit")
+        if _budget_mb:
+            with _registry_lock:
+                if name in _recent:
+                    _recent.move_to_end(name)
+        return model
+    if name not in _loaders:
+        raise KeyError(f"Unknown model '{name}'. Registered: {sorted(_loaders)}")
+
+    with _locks[name]:
+        if name not in _models:
+            _load(name)
+        return _models[name]
+
+
+def _load(name):
+    stats = _stats[name]
+    reload = stats["misses"] > 0
+    stats["misses"] += 1
+    count("model_cache", model=name, result="miss")
+    with _memory_lock if _budget_mb else contextlib.nullcontext():
+        if _budget_mb:
+            # Make room for the size this model had last time (unknown the first time)
+            _evict_until(_budget_mb - _sizes_mb.get(name, 0.0), keep=name)
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        with span("model_load"):
+            _models[name] = _loaders[name]()
+        seconds = _load_times[name] = time.perf_counter() - start
+        rss_after = rss_mb()
+        if rss_before is not None and rss_after is not None:
+            _sizes_mb[name] = max(0.0, rss_after - rss_before)
+        with _registry_lock:
+            _recent[name] = True
+        if _budget_mb:
+            _evict_until(_budget_mb, keep=name)
+    if reload:
+        stats["reload_s"].append(seconds)
+    print(f"{'Reloaded' if reload else 'Loaded'} model '{name}' in {seconds:.1f}s")
+
+
+def _evict_until(limit_mb, keep):
+    """
+    Unload least recently used models (never `keep`) until the RSS is at
+    most `limit_mb`, nothing else is left to unload, or an unload frees
+    nothing (a caller still holds that model, or the memory is not the
+    models'), in which case unloading more would only cost reloads.
+    """
+    current = rss_mb()
+    while current is not None and current > limit_mb:
+        with _registry_lock:
+            victim = next((name for name in _recent if name != keep), None)
+        if victim is None:
+            print(f"Model memory budget of {_budget_mb:.0f} MiB exceeded by '{keep}' alone "
+                  f"({current:.0f} MiB resident)", file=sys.stderr)
+            return
+        unload(victim)
+        before, current = current, rss_mb()
+        if current is not None and current > before - 1.0:
+            print(f"Unloading '{victim}' freed no memory ({current:.0f} MiB resident); "
+                  f"not unloading more models", file=sys.stderr)
+            return
+
+
+def unload(name):
+    """
+    Drop the registry's reference to a loaded model; the next `get` loads it again.
+    Memory is freed once no caller still holds the model.
+    """
+    with _registry_lock:
+        _recent.pop(name, None)
+        model = _models.pop(name, None)
+    if model is None:
+        return
+    _stats[name]["evictions"] += 1
+    count("model_evictions", model=name)
+    del model
+    gc.collect()
+    _release_free_memory()
+    print(f"Unloaded model '{name}' (~{_sizes_mb.get(name, 0.0):.0f} MiB)")
+
+
+def _release_free_memory():
+    # glibc keeps freed heap pages mapped; hand them back so the RSS drops
+    try:
+        import ctypes
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def rss_mb():
+    """
+    Current resident set size of this process in MiB (None if unknown).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        return None
+
+
+def set_memory_budget(mb):
+    """
+    Keep the process RSS under `mb` MiB by unloading least recently used
+    models (0 or None turns the budget off).
+    """
+    global _budget_mb
+    _budget_mb = float(mb or 0)
+    if _budget_mb:
+        _evict_until(_budget_mb, keep=None)
+
+
+def warm_up(names=None):
+    """
+    Load `names` (default: DEFAULT_MODELS, the ones the app uses) and return
+    their load times. Names with an optimised build selected by
+    `set_inference_mode` load that build.
+    """
+    for name in names or DEFAULT_MODELS:
+        get(variant(name))
+    return load_times()
+
+
+def load_times():
+    """
+    Seconds each loaded model took to build, by name.
+    """
+    return dict(_load_times)
+
+
+def stats():
+    """
+    Memory budget, process RSS and, per model that has been used, whether it
+    is loaded, its resident size, cache hits and misses, evictions and
+    reload latencies.
+    """
+    models = {}
+    for name, s in _stats.items():
+        if s["hits"] or s["misses"]:
+            models[name] = {
+                "loaded": name in _models,
+                "size_mb": _sizes_mb.get(name),
+                "hits": s["hits"],
+                "misses": s["misses"],
+                "evictions": s["evictions"],
+                "reloads": len(s["reload_s"]),
+                "reload_s_mean": sum(s["reload_s"]) / len(s["reload_s"]) if s["reload_s"] else None,
+                "reload_s_max": max(s["reload_s"], default=None),
+            }
+    return {"budget_mb": _budget_mb or None, "rss_mb": rss_mb(), "models": models}
+
+
+# ── Optimised inference variants ──────────────────────────────────────
+# Which build of each model `variant()` hands out: "fp32" (eager PyTorch),
+# "int8" (dynamic quantisation of the Linear layers) or, for Whisper only,
+# "onnx" (ONNX Runtime). Converted models are cached under OPTIMIZED_CACHE_DIR.
+
+OPTIMIZED_CACHE_DIR = os.environ.get("VOICE_AUTH_MODEL_CACHE", "pretrained_models/optimized")
+_inference_modes = {
+    "whisper": os.environ.get("VOICE_AUTH_WHISPER_MODE", "fp32"),
+    "titanet": os.environ.get("VOICE_AUTH_TITANET_MODE", "fp32"),
+}
+
+
+def set_inference_mode(**modes):
+    """
+    Choose the build per model, e.g. set_inference_mode(whisper="onnx", titanet="int8").
+    """
+    for name, mode in modes.items():
+        if mode != "fp32" and f"{name}-{mode}" not in _loaders:
+            raise ValueError(f"No '{mode}' build registered for '{name}'")
+        _inference_modes[name] = mode
+
+
+def variant(name):
+    """
+    Registry key of the build of `name` selected by `set_inference_mode`.
+    """
+    mode = _inference_modes.get(name, "fp32")
+    return name if mode == "fp32" else f"{name}-{mode}"
+
+
+def _quantize_int8(load_fp32, cache_name=None, skeleton=None):
+    """
+    Build a copy of a model with its Linear layers dynamically quantised to int8.
+
+    With `cache_name` and `skeleton` (a callable building the architecture
+    without pretrained weights), the quantised state is saved on the first
+    conversion; later loads quantise the empty skeleton and load that state,
+    skipping the fp32 weights and the calibration-free conversion of them.
+    Otherwise the fp32 model is loaded and converted every time.
+    """
+    import torch
+
+    def quantize(model):
+        torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return model
+
+    path = os.path.join(OPTIMIZED_CACHE_DIR, f"{cache_name}.pt") if cache_name and skeleton else None
+    if path and os.path.exists(path):
+        model = quantize(skeleton())
+        model.load_state_dict(torch.load(path, map_location="cpu"))
+    else:
+        model = quantize(load_fp32())
+        if path:
+            os.makedirs(OPTIMIZED_CACHE_DIR, exist_ok=True)
+            torch.save(model.state_dict(), path)
+    model.eval()
+    return model
+
+
+# ── Loaders ───────────────────────────────────────────────────────────
+
+def _load_whisper():
+    from transformers import WhisperForConditionalGeneration, WhisperProcessor
+    model = WhisperForConditionalGeneration.from_pretrained("openai/whisper-tiny")
+    processor = WhisperProcessor.from_pretrained("openai/whisper-tiny")
+    model.eval()
+    return model, processor
+
+
+def _whisper_skeleton():
+    # Architecture and generation settings only; the weights come from the int8 cache
+    from transformers import GenerationConfig, WhisperConfig, WhisperForConditionalGeneration
+    model = WhisperForConditionalGeneration(WhisperConfig.from_pretrained("openai/whisper-tiny"))
+    model.generation_config = GenerationConfig.from_pretrained("openai/whisper-tiny")
+    return model
+
+
+def _load_whisper_int8():
+    from transformers import WhisperProcessor
+    model = _quantize_int8(lambda: _load_whisper()[0], "whisper-tiny-int8", skeleton=_whisper_skeleton)
+    return model, WhisperProcessor.from_pretrained("openai/whisper-tiny")
+
+
+def _load_whisper_onnx():
+    from optimum.onnxruntime import ORTModelForSpeechSeq2Seq
+    from transformers import WhisperProcessor
+    path = os.path.join(OPTIMIZED_CACHE_DIR, "whisper-tiny-onnx")
+    if os.path.isdir(path):
+        model = ORTModelForSpeechSeq2Seq.from_pretrained(path)
+    else:
+        # First use: export to ONNX once and keep it for later processes
+        model = ORTModelForSpeechSeq2Seq.from_pretrained("openai/whisper-tiny", export=True)
+        model.save_pretrained(path)
+    processor = WhisperProcessor.from_pretrained("openai/whisper-tiny")
+    return model, processor
+
+
+def _load_titanet():
+    import nemo.collections.asr as nemo_asr
+    speaker_model = nemo_asr.models.EncDecSpeakerLabelModel.from_pretrained("nvidia/speakerverification_en_titanet_large")
+    speaker_model.eval()
+    return speaker_model
+
+
+def _load_titanet_int8():
+    # TitaNet is mostly convolutions; only its Linear layers (attention pooling
+    # and the embedding head) are quantised. NeMo cannot build the model
+    # without its checkpoint, so it is converted on every load (a few seconds)
+    return _quantize_int8(_load_titanet)
+
+
+def _load_clearvoice():
+    from clearvoice import ClearVoice
+    return ClearVoice(task='speech_enhancement', model_names=['MossFormer2_SE_48K'])
+
+
+def _load_clearvoice16k():
+    from clearvoice import ClearVoice
+    return ClearVoice(task='speech_enhancement', model_names=['MossFormerGAN_SE_16K'])
+
+
+def _load_deepfilternet():
+    from df.enhance import init_df
+    model, df_state, _ = init_df()      # DeepFilterNet3
+    model.eval()
+    return model, df_state
+
+
+def _load_dns64():
+    from denoiser.pretrained import dns64
+    model = dns64()
+    model.eval()
+    return model
+
+
+def _load_sepformer():
+    from speechbrain.inference.separation import SepformerSeparation as separator
+    from speechbrain.utils.fetching import LocalStrategy
+    return separator.from_hparams(
+        source="speechbrain/sepformer-dns4-16k-enhancement",
+        savedir="pretrained_models/sepformer-dns4-16k-enhancement",
+        local_strategy=LocalStrategy.COPY
+    )
+
+
+register("whisper", _load_whisper)
+register("whisper-int8", _load_whisper_int8)
+register("whisper-onnx", _load_whisper_onnx)
+register("titanet", _load_titanet)
+register("titanet-int8", _load_titanet_int8)
+register("clearvoice", _load_clearvoice)
+register("clearvoice16k", _load_clearvoice16k)
+register("deepfilternet", _load_deepfilternet)
+register("dns64", _load_dns64)
+register("sepformer", _load_sepformer)
+
+# Models the app actually uses; warm these up instead of everything registered
+DEFAULT_MODELS = ["whisper", "titanet", "clearvoice16k"]
+
+
+if __name__ == "__main__":
+    # python models.py [name ...]  – load models and print how long each took and their size
+    for name, seconds in warm_up(sys.argv[1:] or DEFAULT_MODELS).items():
+        size = _sizes_mb.get(name)
+        print(f"{name:12s} {seconds:6.1f}s" + (f" {size:8.0f} MiB" if size is not None else ""))
+    print(f"RSS {rss_mb():.0f} MiB")
@@ -1,27 +1,27 @@
-import sounddevice as sd
 import numpy as np
 import matplotlib.pyplot as plt
 from tkinter import TclError
-import wave
 import sys
-from speechbrain.utils.fetching import LocalStrategy
+import time
 import datetime
-from collections import deque
-from voice_enhancement import voice_enhancement
+import queue
+import threading
+import soundfile as sf
+from capture import Capture, simulated_stream_factory
+from voice_enhancement import enhance_stream
 samplerate = 44100
 blocksize  = 1024
 channels   = 1
 
-# A short fixed-length deque to feed the plots
-plot_buffer = deque(maxlen=blocksize)
-
-# Open a timestamped WAV for writing
+# Timestamped WAV, written by the capture thread (never from the audio callback)
 timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
 filename  = f"recorded_{timestamp}.wav"
-wf = wave.open(filename, 'wb')
-wf.setnchannels(channels)
-wf.setsampwidth(2)          # 16-bit
-wf.setframerate(samplerate)
+
+# Enhanced audio is produced while recording, chunk by chunk
+enhanced_filename = f"enhanced_{timestamp}.wav"
+enhance_queue = queue.Queue()
+CHUNK_S     = 1.0    # enhancement chunk length
+LOOKAHEAD_S = 0.25   # look-ahead / overlap; latency = CHUNK_S + LOOKAHEAD_S
 
 # Matplotlib setup
 plt.ion()
@@ -47,57 +47,75 @@ def compute_fft(block):
     windowed = block * np.hanning(len(block))
     return np.abs(np.fft.rfft(windowed))
 
-def audio_callback(indata, frames, time, status):
-    if status:
-        print(status, file=sys.stderr)
-    mono = indata[:,0]
-    # write raw PCM to WAV
-    pcm = np.int16(mono * 32767)
-    # write raw PCM to WAV, ignore if file is already closed
+def enhancement_worker():
+    """
+    Enhance captured blocks while recording continues and stream them to disk.
+    """
+    out = None
     try:
-        wf.writeframes(pcm.tobytes())
-    except AttributeError:
-        pass
-    # enqueue for plotting
-    plot_buffer.extend(mono)
+        blocks = iter(enhance_queue.get, None)
+        for cleaned, sr in enhance_stream(blocks, samplerate, chunk_s=CHUNK_S, lookahead_s=LOOKAHEAD_S):
+            if out is None:
+                out = sf.SoundFile(enhanced_filename, "w", samplerate=sr, channels=1, subtype="PCM_16")
+            out.write(cleaned)
+    finally:
+        if out is not None:
+            out.close()
 
-def start():
+def start(simulate=None):
+    """
+    Record (from the mic, or by replaying the `simulate` WAV) until Ctrl+C.
+    """
     print("Recording… press Ctrl+C to stop.")
-    with sd.InputStream(channels=1,
-                        samplerate=samplerate,
-                        blocksize=blocksize,
-                        dtype='float32',
-                        callback=audio_callback):
+    enhancer = threading.Thread(target=enhancement_worker, daemon=True)
+    enhancer.start()
+    # The writer thread hands each batch it drains to the enhancement thread
+    capture = Capture(filename, samplerate, channels, blocksize,
+                      consumers=[lambda batch: enhance_queue.put(batch[:, 0])],
+                      stream_factory=simulated_stream_factory(simulate) if simulate else None)
+    plotted = 0
+    with capture:
         try:
             while True:
-                if len(plot_buffer) >= blocksize:
-                    # grab exactly one block for plotting
-                    block = np.array([plot_buffer.popleft() for _ in range(blocksize)])
-                    
-                    # update energy
-                    e = compute_energy(block)
-                    energy_vals.append(e)
-                    energy_vals.pop(0)
-                    energy_line.set_ydata(energy_vals)
+                if simulate and capture._stream.finished.is_set():
+                    break
+                if capture.ring.written - plotted < blocksize:
+                    time.sleep(blocksize / samplerate / 2)
+                    continue
+                # peek at the newest block for plotting
+                plotted = capture.ring.written
+                block = capture.ring.latest(blocksize)[:, 0]
+
+                # update energy
+                e = compute_energy(block)
+                energy_vals.append(e)
+                energy_vals.pop(0)
+                energy_line.set_ydata(energy_vals)
 
-                    # update FFT
-                    fft_vals = compute_fft(block)
-                    fft_line.set_ydata(fft_vals)
-                    ax2.set_ylim(0, np.max(fft_vals)+10)
+                # update FFT
+                fft_vals = compute_fft(block)
+                fft_line.set_ydata(fft_vals)
+                ax2.set_ylim(0, np.max(fft_vals)+10)
 
-                    # update plots, ignore Tkinter errors
-                    try:
-                        fig.canvas.draw()
-                        plt.pause(0.001)
-                    except TclError:
-                        pass
+                # update plots, ignore Tkinter errors
+                try:
+                    fig.canvas.draw()
+                    plt.pause(0.001)
+                except TclError:
+                    pass
         except KeyboardInterrupt:
             print("Stopped.")
         finally:
-            wf.close()
+            capture.stop()
             print(f"Audio saved as '{filename}'")
-            voice_enhancement(filename)
-            print("Audio enhancement completed.")
+            stats = capture.stats()
+            print(f"Captured {stats['frames_captured']} frames, "
+                  f"{stats['overruns']} overruns, {stats['dropped_frames']} dropped frames")
+            # Only the last chunk is left to enhance at this point
+            enhance_queue.put(None)
+            enhancer.join()
+            print(f"Enhanced audio saved as '{enhanced_filename}'")
 
 if __name__ == "__main__":
-    start()
+    # python noice_testing.py [--simulate input.wav]
+    start(simulate=sys.argv[2] if len(sys.argv) == 3 and sys.argv[1] == "--simulate" else None)
@@ -0,0 +1,192 @@
+"""
+Run independent pipeline stages at the same time.
+
+Transcription and speaker verification both only need the enhanced audio,
+so they can run side by side: PyTorch releases the GIL inside its kernels,
+which makes a thread pool enough to overlap them. End-to-end latency is then
+close to the slowest stage instead of the sum of all of them.
+"""
+import os
+import time
+import threading
+import contextvars
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import tracing
+
+_thread_pool = None
+_pool_lock = threading.Lock()
+_process_pools = {}     # (workers, intra_op_threads) -> ProcessPoolExecutor
+_threads_saved = None   # PyTorch's thread count before thread-mode calls changed it
+_threads_users = 0      # thread-mode calls currently running with a changed setting
+
+
+def _cpu_count():
+    return os.cpu_count() or 1
+
+
+def set_intra_op_threads(n):
+    """
+    Limit the number of threads PyTorch uses inside each operator.
+    """
+    import torch
+    if n and torch.get_num_threads() != n:
+        torch.set_num_threads(n)
+
+
+def _init_worker(intra_op_threads):
+    set_intra_op_threads(intra_op_threads)
+
+
+def _timed(fn, name):
+    tracing.attach_thread()
+    start = time.perf_counter()
+    with tracing.span(f"stage:{name}"):
+        result = fn()
+    return result, time.perf_counter() - start
+
+
+def run_parallel(stages, mode="thread", intra_op_threads="auto", max_workers=None):
+    """
+    Run independent stages concurrently.
+
+    Args:
+        stages (dict): Stage name -> zero-argument callable (e.g. a functools.partial)
+        mode (str): "thread" to share the loaded models, "process" for full isolation
+            (callables must then be picklable and each worker loads its own models)
+        intra_op_threads (int | str | None): PyTorch threads per stage. "auto" splits the
+            cores evenly between the stages in process mode and leaves the setting
+            alone in thread mode, where it is process-wide and cannot give each
+            stage its own budget. An explicit number in thread mode applies while
+            the stages run and is restored afterwards; None leaves PyTorch's setting alone
+        max_workers (int): Pool size (default: one worker per stage)
+
+    Returns:
+        tuple: ({stage name: result}, {stage name: seconds})
+    """
+    global _thread_pool
+
+    workers = max_workers or len(stages)
+    if intra_op_threads == "auto":
+        intra_op_threads = max(1, _cpu_count() // max(1, len(stages))) if mode == "process" else None
+
+    if mode == "thread":
+        with _pool_lock:
+            # One pool shared by every caller, sized so concurrent sessions do not queue behind each other
+            if _thread_pool is None or _thread_pool._max_workers < workers:
+                _thread_pool = ThreadPoolExecutor(max_workers=max(workers, _cpu_count()),
+                                                  thread_name_prefix="stage")
+            pool = _thread_pool
+    elif mode == "process":
+        key = (workers, intra_op_threads)
+        with _pool_lock:
+            if key not in _process_pools:
+                _process_pools[key] = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                          initargs=(intra_op_threads,))
+            pool = _process_pools[key]
+    else:
+        raise ValueError(f"Unknown mode '{mode}', expected 'thread' or 'process'")
+
+    if mode == "thread" and intra_op_threads:
+        _limit_threads(intra_op_threads)
+    try:
+        if mode == "thread":
+            # Each stage runs in a copy of the caller's context so its spans join the caller's trace
+            futures = {name: pool.submit(contextvars.copy_context().run, _timed, fn, name)
+                       for name, fn in stages.items()}
+        else:
+            futures = {name: pool.submit(_timed, fn, name) for name, fn in stages.items()}
+        results, timings = {}, {}
+        for name, future in futures.items():
+            results[name], timings[name] = future.result()
+    finally:
+        if mode == "thread" and intra_op_threads:
+            _restore_threads()
+    return results, timings
+
+
+def _limit_threads(n):
+    # Intra-op threads are process-wide: remember the original setting for the
+    # last of any overlapping calls to put back
+    global _threads_saved, _threads_users
+    import torch
+    with _pool_lock:
+        if _threads_users == 0:
+            _threads_saved = torch.get_num_threads()
+        _threads_users += 1
+        set_intra_op_threads(n)
+
+
+def _restore_threads():
+    global _threads_users
+    with _pool_lock:
+        _threads_users -= 1
+        if _threads_users == 0:
+            set_intra_op_threads(_threads_saved)
+
+
+# ── The app's authentication flow ─────────────────────────────────────
+
+def default_stages():
+    """
+    The real stage functions: {"enhance", "transcribe", "verify"}.
+    Anything with the same signatures (e.g. benchmarks/stubs.py) can stand in.
+    When $VOICE_AUTH_SERVER is set, transcription and verification are sent
+    to the inference server (server.py) instead of running in this process.
+    """
+    from voice_enhancement import enhance_audio
+    from client import get_client
+
+    remote = get_client()
+    if remote is not None:
+        return {"enhance": enhance_audio, "transcribe": remote.transcribe, "verify": remote.verify_speakers}
+
+    from functions import transcribe
+    from Speaker_Authontication import verify_speakers
+    return {"enhance": enhance_audio, "transcribe": transcribe, "verify": verify_speakers}
+
+
+def transcribe_and_verify(audio, sr, speaker_db="speakers", stages=None):
+    """
+    Transcribe an enhanced recording and identify its speaker concurrently.
+
+    Returns:
+        dict: {"text": str, "speaker": verify_speakers result, "timings": {stage: seconds}}
+    """
+    from audio_utils import AudioBuffer
+
+    stages = stages or default_stages()
+    # Both stages want 16 kHz: with a shared buffer the conversion (if any) runs once
+    if not isinstance(audio, AudioBuffer):
+        audio = AudioBuffer(audio, sr)
+    results, timings = run_parallel({
+        "transcribe": partial(stages["transcribe"], audio, sr=sr),
+        "verify": partial(stages["verify"], audio, speaker_db=speaker_db, sr=sr),
+    })
+    return {"text": results["transcribe"], "speaker": results["verify"], "timings": timings}
+
+
+def authenticate(audio, sr, speaker_db="speakers", stages=None, vad=True):
+    """
+    Full record → VAD trim → enhance → (transcribe ‖ verify) flow for one raw recording.
+    """
+    from vad import trim_silence
+
+    stages = stages or default_stages()
+    timings, vad_stats = {}, None
+    with tracing.request("authenticate"):
+        if vad:
+            start = time.perf_counter()
+            with tracing.span("vad"):
+                audio, vad_stats = trim_silence(audio, sr)
+            timings["vad"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        enhanced, enhanced_sr = stages["enhance"](audio, sr)
+        timings["enhance"] = time.perf_counter() - start
+
+        result = transcribe_and_verify(enhanced, enhanced_sr, speaker_db=speaker_db, stages=stages)
+    result["timings"].update(timings)
+    result["vad"] = vad_stats
+    return result
@@ -0,0 +1,370 @@
+"""
+Local inference service with dynamic micro-batching.
+
+Concurrent requests from any number of clients (the Streamlit app, CLI
+scripts, the load test) are queued per model and run together: a batch is
+dispatched as soon as `max_batch` requests are waiting or the oldest one has
+waited `max_wait_ms`. Queues are bounded; when one is full, HTTP requests
+are refused with 503 + Retry-After, and WebSocket clients simply wait for
+room before their request is accepted.
+
+    python server.py --port 8765 --max-batch 8 --max-wait-ms 20
+    python server.py --stub-models              # NumPy stand-ins, no model downloads
+
+Endpoints (audio is the raw little-endian float32 mono request body, with its
+sample rate in the `sr` query parameter; see client.py):
+
+    POST /transcribe            -> {"text": ...}
+    POST /embedding             -> {"embedding": [...]}
+    POST /phrase?phrases=&threshold=
+                                -> verify_phrase result (phrases is a JSON list of accepted phrasings)
+    POST /verify?speaker_db=&threshold=&top_k=&search=&nprobe=
+                                -> verify_speakers result (speaker_db is relative to --speaker-root)
+    GET  /health                -> queue depths, batch statistics and model memory (models.stats)
+    GET  /metrics               -> Prometheus text (tracing.py); /metrics.json for the JSON dump
+    GET  /ws                    WebSocket: a JSON text message {"id", "op", "sr", ...params}
+                                followed by one binary audio message; replies {"id", "result"}
+                                (or {"id", "error"}), possibly out of order
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import tracing
+from audio_utils import load_audio
+
+SR = 16000
+WS_MAX_IN_FLIGHT = 16     # unanswered requests per WebSocket connection
+
+
+class Overloaded(Exception):
+    """
+    Raised when a batcher's queue is full.
+    """
+
+
+class MicroBatcher:
+    """
+    Collect concurrent `submit` calls into batches for `batch_fn`.
+
+    Args:
+        batch_fn (callable): Takes a list of items, returns a list of results in order.
+            Runs on its own worker thread, so it can block (e.g. a model forward pass)
+        max_batch (int): Largest batch handed to `batch_fn`
+        max_wait_ms (float): How long the first request of a batch waits for company
+        max_queue (int): Requests allowed to wait; beyond that `submit` applies backpressure
+    """
+
+    def __init__(self, batch_fn, max_batch=8, max_wait_ms=20, max_queue=64, name="batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._queue = None
+        self._task = None
+        # One thread per batcher: batches of the same model never overlap,
+        # while different models still run side by side
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, item, wait=False):
+        """
+        Queue `item` and return its result once its batch has run. When the
+        queue is full, raise Overloaded, or wait for room if `wait` is set.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if wait:
+            await self._queue.put((item, future))
+        else:
+            try:
+                self._queue.put_nowait((item, future))
+            except asyncio.QueueFull:
+                raise Overloaded(f"{self.name} queue is full ({self.max_queue} waiting)")
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Requests whose client went away are not worth computing
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+            try:
+                results = await loop.run_in_executor(self._executor, self.batch_fn, [item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            "queued": self.depth(),
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": self.items / self.batches if self.batches else 0.0,
+        }
+
+
+# ── Batch functions ───────────────────────────────────────────────────
+
+def model_batch_fns():
+    """
+    {"transcribe", "embedding", "phrase"} batch functions over lists of 16 kHz
+    arrays ("phrase" items are (clip, phrases, threshold) tuples).
+    """
+    import functions
+    from Speaker_Authontication import extract_embeddings
+
+    def embed(clips):
+        # Length-bucketed, so short and long clips in one micro-batch do not pad each other
+        return list(extract_embeddings(clips, sr=SR, batch_size=len(clips)))
+
+    def phrase(items):
+        # One teacher-forced pass per clip: each request brings its own phrases
+        return [functions.verify_phrase(clip, phrases, **_threshold_kwarg(threshold))
+                for clip, phrases, threshold in items]
+
+    return {"transcribe": functions._transcribe_arrays, "embedding": embed, "phrase": phrase}
+
+
+def stub_batch_fns():
+    from benchmarks.stubs import stub_transcribe, stub_embedding, stub_verify_phrase
+    return {
+        "transcribe": lambda clips: [stub_transcribe(clip, sr=SR) for clip in clips],
+        "embedding": lambda clips: [stub_embedding(clip, sr=SR) for clip in clips],
+        "phrase": lambda items: [stub_verify_phrase(clip, phrases, sr=SR, **_threshold_kwarg(threshold))
+                                 for clip, phrases, threshold in items],
+    }
+
+
+def _threshold_kwarg(threshold):
+    # No threshold from the client means the phrase check's own default
+    return {} if threshold is None else {"threshold": threshold}
+
+
+# ── Service ───────────────────────────────────────────────────────────
+
+class InferenceService:
+    """
+    The batchers plus the request handling shared by HTTP and WebSocket.
+    """
+
+    def __init__(self, batch_fns, max_batch=8, max_wait_ms=20, max_queue=64, speaker_root="."):
+        self.batchers = {op: MicroBatcher(fn, max_batch, max_wait_ms, max_queue, name=op)
+                         for op, fn in batch_fns.items()}
+        self.speaker_root = os.path.realpath(speaker_root)
+        self.started = time.time()
+
+    def speaker_db(self, name):
+        """
+        Resolve a client's `speaker_db` to an existing directory under
+        `speaker_root`, so requests cannot read or write anywhere else.
+        """
+        path = os.path.realpath(os.path.join(self.speaker_root, name))
+        if os.path.commonpath([path, self.speaker_root]) != self.speaker_root or not os.path.isdir(path):
+            raise ValueError(f"Unknown speaker_db '{name}'")
+        return path
+
+    async def start(self):
+        import Speaker_Authontication      # noqa: F401  (so the first verify does not pay for the import)
+        for batcher in self.batchers.values():
+            batcher.start()
+
+    async def stop(self):
+        for batcher in self.batchers.values():
+            await batcher.stop()
+
+    async def handle(self, op, audio, sr, params, wait=False):
+        """
+        Run one request; `op` is "transcribe", "embedding", "verify" or "phrase".
+        """
+        with tracing.request(op):
+            return await self._handle(op, audio, sr, params, wait)
+
+    async def _handle(self, op, audio, sr, params, wait):
+        from Speaker_Authontication import verify_embedding
+
+        clip = load_audio(audio, SR, orig_sr=sr)
+        if op == "transcribe":
+            return {"text": await self.batchers["transcribe"].submit(clip, wait)}
+        if op == "phrase":
+            phrases = params.get("phrases")
+            # JSON-encoded in an HTTP query, a plain list in a WebSocket header
+            if isinstance(phrases, str):
+                phrases = json.loads(phrases)
+            if not phrases or not isinstance(phrases, list):
+                raise ValueError("'phrases' must be a non-empty list")
+            threshold = params.get("threshold")
+            threshold = None if threshold is None else float(threshold)
+            return await self.batchers["phrase"].submit((clip, phrases, threshold), wait)
+        if op not in ("embedding", "verify"):
+            raise ValueError(f"Unknown operation '{op}'")
+
+        embedding = await self.batchers["embedding"].submit(clip, wait)
+        if op == "embedding":
+            return {"embedding": embedding.tolist()}
+        kwargs = {
+            "speaker_db": self.speaker_db(params.get("speaker_db", "speakers")),
+            "threshold": float(params.get("threshold", 0.7)),
+            "top_k": int(params.get("top_k", 1)),
+            "search": params.get("search", "exact"),
+            "nprobe": int(params.get("nprobe", 8)),
+        }
+        # Index lookups can touch the disk (refresh, IVF build): keep them off the event loop
+        return await asyncio.get_running_loop().run_in_executor(
+            None, lambda: verify_embedding(embedding, **kwargs))
+
+    def health(self):
+        import models
+        return {"uptime_s": time.time() - self.started,
+                "batchers": {op: b.stats() for op, b in self.batchers.items()},
+                "models": models.stats()}
+
+
+def create_app(service):
+    from aiohttp import web, WSMsgType
+
+    async def http_handler(request):
+        op = request.match_info["op"]
+        body = await request.read()
+        params = dict(request.query)
+        try:
+            audio = np.frombuffer(body, dtype="<f4")
+            sr = int(params.pop("sr", SR))
+            result = await service.handle(op, audio, sr, params)
+        except Overloaded as e:
+            return web.json_response({"error": str(e)}, status=503, headers={"Retry-After": "1"})
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        return web.json_response(result)
+
+    async def health_handler(request):
+        return web.json_response(service.health())
+
+    async def metrics_handler(request):
+        return web.Response(text=tracing.prometheus_text(), content_type="text/plain")
+
+    async def metrics_json_handler(request):
+        return web.json_response(tracing.to_json())
+
+    async def ws_handler(request):
+        ws = web.WebSocketResponse(max_msg_size=64 * 2**20)
+        await ws.prepare(request)
+        pending = set()
+        # Stop reading from a client that already has this many requests in flight
+        slots = asyncio.Semaphore(WS_MAX_IN_FLIGHT)
+
+        async def answer(header, body):
+            try:
+                audio = np.frombuffer(body, dtype="<f4")
+                result = await service.handle(header["op"], audio, int(header.get("sr", SR)), header, wait=True)
+                reply = {"id": header.get("id"), "result": result}
+            except Exception as e:
+                reply = {"id": header.get("id"), "error": str(e)}
+            if not ws.closed:
+                await ws.send_json(reply)
+
+        header = None
+        async for msg in ws:
+            if msg.type == WSMsgType.TEXT:
+                header = json.loads(msg.data)
+            elif msg.type == WSMsgType.BINARY and header is not None:
+                await slots.acquire()
+                task = asyncio.create_task(answer(header, msg.data))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                task.add_done_callback(lambda _: slots.release())
+                header = None
+        for task in pending:
+            task.cancel()
+        return ws
+
+    app = web.Application(client_max_size=64 * 2**20)
+    app.router.add_post("/{op:transcribe|embedding|verify|phrase}", http_handler)
+    app.router.add_get("/health", health_handler)
+    app.router.add_get("/metrics", metrics_handler)
+    app.router.add_get("/metrics.json", metrics_json_handler)
+    app.router.add_get("/ws", ws_handler)
+
+    async def on_startup(app):
+        await service.start()
+
+    async def on_cleanup(app):
+        await service.stop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=8, help="Largest micro-batch per model")
+    parser.add_argument("--max-wait-ms", type=float, default=20, help="Longest a request waits for its batch to fill")
+    parser.add_argument("--max-queue", type=int, default=64, help="Requests queued per model before refusing more")
+    parser.add_argument("--speaker-root", default=".",
+                        help="Directory that every requested speaker_db must lie under")
+    parser.add_argument("--stub-models", action="store_true", help="Use the NumPy stand-ins instead of real models")
+    parser.add_argument("--no-trace", action="store_true", help="Disable span timing and /metrics data")
+    parser.add_argument("--profile", action="store_true", help="Sample call stacks of the slowest requests")
+    args = parser.parse_args(argv)
+
+    from aiohttp import web
+
+    tracing.enable(not args.no_trace, profile=args.profile)
+
+    if args.stub_models:
+        batch_fns = stub_batch_fns()
+    else:
+        import models
+        models.warm_up(["whisper", "titanet"])
+        batch_fns = model_batch_fns()
+    service = InferenceService(batch_fns, args.max_batch, args.max_wait_ms, args.max_queue, args.speaker_root)
+    web.run_app(create_app(service), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
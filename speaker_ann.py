@@ -0,0 +1,278 @@
+import os
+import threading
+import numpy as np
+
+from speaker_index import get_index
+
+IVF_FILENAME = "ivf_index.npz"
+RETRAIN_GROWTH = 4          # retrain the centroids once the index is this many times its trained size
+SAVE_EVERY_RECORDS = 256    # store records applied in memory before the .npz is rewritten
+
+
+def _normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _spherical_kmeans(vectors, n_lists, n_iter=10, seed=0, chunk=65536):
+    """
+    Cluster unit vectors into `n_lists` centroids by cosine similarity.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].astype(np.float32)
+    assign = np.zeros(len(vectors), dtype=np.int32)
+
+    for _ in range(n_iter):
+        for start in range(0, len(vectors), chunk):
+            block = vectors[start:start + chunk].astype(np.float32)
+            assign[start:start + chunk] = np.argmax(block @ centroids.T, axis=1)
+
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=n_lists)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(vectors[order].astype(np.float32), starts[~empty], axis=0)
+        if empty.any():
+            # Re-seed empty lists with random points so every list stays useful
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = _normalize_rows(sums)
+
+    return centroids, assign
+
+
+class IVFIndex:
+    """
+    Approximate nearest-neighbour index over voiceprints (inverted file).
+
+    Voiceprints are clustered into `n_lists` cells; a query is only scored
+    against the members of its `nprobe` closest cells. Larger `nprobe`
+    trades latency for recall (`nprobe == n_lists` is an exact scan).
+    Vectors are kept as float16 by default to halve memory, in a buffer
+    that doubles when full so inserts do not copy the whole matrix.
+    """
+
+    def __init__(self, centroids, nprobe=8, dtype=np.float16):
+        self.centroids = _normalize_rows(centroids)
+        self.nprobe = nprobe
+        self.dtype = np.dtype(dtype)
+        self.names = []
+        self._rows = {}
+        self._vectors = np.zeros((0, self.centroids.shape[1]), dtype=self.dtype)
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists = [[] for _ in range(len(self.centroids))]
+        self._lock = threading.RLock()
+        self.trained_size = 0       # voiceprints the centroids were trained on
+        self.saved_records = 0      # store records reflected in the saved .npz
+        # (generation, record count) of the voiceprint store this index reflects
+        self.store_seen = (None, 0)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @property
+    def needs_retrain(self):
+        """
+        True once the index has grown so far past the set the centroids were
+        trained on that its lists are too coarse to prune much.
+        """
+        return len(self.names) >= RETRAIN_GROWTH * max(self.trained_size, 1)
+
+    @classmethod
+    def build(cls, names, matrix, n_lists=None, nprobe=8, n_iter=10, dtype=np.float16, seed=0):
+        """
+        Train centroids on `matrix` (one voiceprint per row) and index it.
+        `n_lists` defaults to about 4·sqrt(N).
+        """
+        vectors = _normalize_rows(matrix)
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(len(vectors)))
+        n_lists = max(1, min(n_lists, len(vectors)))
+        centroids, assign = _spherical_kmeans(vectors, n_lists, n_iter=n_iter, seed=seed)
+
+        index = cls(centroids, nprobe=nprobe, dtype=dtype)
+        index.names = list(names)
+        index._rows = {name: row for row, name in enumerate(index.names)}
+        index._vectors = vectors.astype(index.dtype)
+        index._assign = assign
+        index.trained_size = len(vectors)
+        for row, cell in enumerate(assign):
+            index._lists[cell].append(row)
+        return index
+
+    def add(self, name, embedding):
+        """
+        Insert or replace one voiceprint without retraining the centroids.
+        """
+        vec = _normalize_rows(np.asarray(embedding).reshape(1, -1))
+        cell = int(np.argmax(vec @ self.centroids.T))
+        with self._lock:
+            if name in self._rows:
+                row = self._rows[name]
+                self._lists[self._assign[row]].remove(row)
+                self._vectors[row] = vec[0]
+                self._assign[row] = cell
+            else:
+                row = len(self.names)
+                if row == len(self._vectors):
+                    capacity = max(16, 2 * row)
+                    vectors = np.zeros((capacity, self._vectors.shape[1]), dtype=self.dtype)
+                    vectors[:row] = self._vectors[:row]
+                    assign = np.zeros(capacity, dtype=np.int32)
+                    assign[:row] = self._assign[:row]
+                    self._vectors, self._assign = vectors, assign
+                self.names.append(name)
+                self._rows[name] = row
+                self._vectors[row] = vec[0]
+                self._assign[row] = cell
+            self._lists[cell].append(row)
+
+    def remove(self, name):
+        """
+        Drop one voiceprint; the last row moves into its slot.
+        """
+        with self._lock:
+            row = self._rows.pop(name, None)
+            if row is None:
+                return False
+            self._lists[self._assign[row]].remove(row)
+            last = len(self.names) - 1
+            if row != last:
+                moved = self.names[last]
+                cell = self._assign[last]
+                self._lists[cell].remove(last)
+                self._lists[cell].append(row)
+                self.names[row] = moved
+                self._rows[moved] = row
+                self._vectors[row] = self._vectors[last]
+                self._assign[row] = cell
+            self.names.pop()
+            return True
+
+    def search(self, query, k=1, nprobe=None):
+        """
+        Return up to `k` (name, cosine similarity) pairs, best first.
+        """
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        q = _normalize_rows(np.asarray(query).reshape(1, -1))[0]
+        with self._lock:
+            if not self.names:
+                return []
+            cells = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+            rows = np.fromiter((r for c in cells for r in self._lists[c]), dtype=np.int64)
+            if rows.size == 0:
+                return []
+            scores = self._vectors[rows].astype(np.float32) @ q
+            k = min(k, rows.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.names[rows[i]], float(scores[i])) for i in top]
+
+    def save(self, path):
+        """
+        Persist the index as a single .npz file.
+        """
+        with self._lock:
+            n = len(self.names)
+            tmp = path + ".tmp.npz"
+            np.savez(tmp, centroids=self.centroids, vectors=self._vectors[:n],
+                     assign=self._assign[:n], names=np.array(self.names, dtype=str),
+                     nprobe=np.int32(self.nprobe), trained_size=np.int64(self.trained_size),
+                     store_generation=np.int64(-1 if self.store_seen[0] is None else self.store_seen[0]),
+                     store_records=np.int64(self.store_seen[1]))
+            os.replace(tmp, path)
+            self.saved_records = self.store_seen[1]
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(data["centroids"], nprobe=int(data["nprobe"]), dtype=data["vectors"].dtype)
+            index.names = [str(n) for n in data["names"]]
+            index._rows = {name: row for row, name in enumerate(index.names)}
+            index._vectors = data["vectors"]
+            index._assign = data["assign"]
+            index.trained_size = int(data["trained_size"]) if "trained_size" in data else len(index.names)
+            if "store_generation" in data:
+                generation = int(data["store_generation"])
+                index.store_seen = (None if generation < 0 else generation, int(data["store_records"]))
+                index.saved_records = index.store_seen[1]
+        for row, cell in enumerate(index._assign):
+            index._lists[cell].append(row)
+        return index
+
+
+_ann_indexes = {}    # speaker_db -> (mtime_ns of the .npz, IVFIndex)
+
+
+def _sync(index, speaker_db, nprobe):
+    """
+    Bring `index` up to date with the voiceprint store: apply the records
+    written since it was last synced (enrolments and removals, from any
+    process), or rebuild it if the store was recreated or compacted or the
+    index outgrew its centroids. Returns the up-to-date index, or None if
+    the store is empty.
+
+    The .npz is rewritten on a rebuild and every SAVE_EVERY_RECORDS applied
+    records; a process loading an older file replays the rest from the store.
+    """
+    store = get_index(speaker_db).store
+    store.refresh()
+    current = (store.generation, store.n_records)
+    if index is not None and index.store_seen == current:
+        return index
+
+    rebuilt = index is None or index.store_seen[0] != store.generation
+    if not rebuilt:
+        for name in {store.record_name(i) for i in range(index.store_seen[1], store.n_records)}:
+            if name in store:
+                index.add(name, store.mean(name))
+            else:
+                index.remove(name)
+        rebuilt = index.needs_retrain
+    if rebuilt:
+        names, means = store.means()
+        if len(names) == 0:
+            return None
+        # About 4·sqrt(N) lists, retrained from scratch
+        index = IVFIndex.build(names, means, nprobe=nprobe)
+    index.store_seen = current
+    if rebuilt or current[1] - index.saved_records >= SAVE_EVERY_RECORDS:
+        index.save(os.path.join(speaker_db, IVF_FILENAME))
+    return index
+
+
+def get_ann_index(speaker_db="speakers", nprobe=8):
+    """
+    Return the IVF index persisted in `<speaker_db>/ivf_index.npz`, building
+    it from the voiceprint store the first time it is needed and keeping it
+    in step with the store afterwards.
+    """
+    key = os.path.abspath(speaker_db)
+    path = os.path.join(speaker_db, IVF_FILENAME)
+    mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+
+    cached = _ann_indexes.get(key)
+    if cached and cached[0] == mtime:
+        index = cached[1]
+    else:
+        index = IVFIndex.load(path) if mtime is not None else None
+
+    index = _sync(index, speaker_db, nprobe)
+    if index is None:
+        _ann_indexes.pop(key, None)
+        return None
+    _ann_indexes[key] = (os.stat(path).st_mtime_ns, index)
+    return index
+
+
+def update_ann_index(speaker_db="speakers"):
+    """
+    Apply new enrolments to the persisted IVF index, if one has been built.
+    """
+    if os.path.exists(os.path.join(speaker_db, IVF_FILENAME)):
+        get_ann_index(speaker_db)
@@ -0,0 +1,172 @@
+import os
+import time
+import threading
+import numpy as np
+
+from voiceprint_store import get_voiceprint_store
+
+
+class SpeakerIndex:
+    """
+    In-memory index of every voiceprint in a speaker database.
+
+    All embeddings live in one pre-normalised float32 matrix, so scoring a
+    query against N enrolled speakers is a single matrix-vector product.
+    Voiceprints come from the database's VoiceprintStore; a refresh only
+    applies the records appended since the previous one.
+    """
+
+    def __init__(self, speaker_db="speakers", refresh_interval=2.0):
+        self.speaker_db = speaker_db
+        self.refresh_interval = refresh_interval
+        self.names = []            # row -> speaker name
+        self._rows = {}            # speaker name -> row
+        self._store = None
+        self._seen = (None, 0)     # (store generation, records applied)
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._last_refresh = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        self.refresh()
+        return len(self.names)
+
+    def __contains__(self, name):
+        self.refresh()
+        return name in self._rows
+
+    @property
+    def matrix(self):
+        """
+        (n_speakers, dim) view of the normalised voiceprints.
+        """
+        return self._matrix[:len(self.names)]
+
+    @staticmethod
+    def _normalize(embedding):
+        vec = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def _set(self, name, embedding):
+        vec = self._normalize(embedding)
+        if name in self._rows:
+            self._matrix[self._rows[name]] = vec
+            return
+
+        n = len(self.names)
+        if n == 0:
+            self._matrix = np.zeros((16, vec.shape[0]), dtype=np.float32)
+        elif vec.shape[0] != self._matrix.shape[1]:
+            raise ValueError(f"Voiceprint '{name}' has dimension {vec.shape[0]}, "
+                             f"index expects {self._matrix.shape[1]}")
+        elif n == self._matrix.shape[0]:
+            # Grow geometrically so incremental enrolment stays amortised O(1)
+            grown = np.zeros((2 * n, self._matrix.shape[1]), dtype=np.float32)
+            grown[:n] = self._matrix[:n]
+            self._matrix = grown
+
+        self._matrix[n] = vec
+        self._rows[name] = n
+        self.names.append(name)
+
+    def _remove(self, name):
+        row = self._rows.pop(name)
+        last = len(self.names) - 1
+        if row != last:
+            # Move the last row into the hole to keep the matrix dense
+            moved = self.names[last]
+            self._matrix[row] = self._matrix[last]
+            self.names[row] = moved
+            self._rows[moved] = row
+        self.names.pop()
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_voiceprint_store(self.speaker_db)
+        return self._store
+
+    def refresh(self, force=False):
+        """
+        Apply voiceprints added, updated or removed in the store, including
+        by other processes. Checks at most once every `refresh_interval`
+        seconds unless `force`.
+        """
+        now = time.monotonic()
+        if (not force and self._last_refresh is not None
+                and now - self._last_refresh < self.refresh_interval):
+            return
+        with self._lock:
+            self._last_refresh = now
+            store = self.store
+            store.refresh()
+            generation, applied = self._seen
+            if generation != store.generation:
+                # New or compacted store: rebuild from its live speakers
+                for name in list(self._rows):
+                    self._remove(name)
+                names, means = store.means()
+                for name, mean in zip(names, means):
+                    self._set(name, mean)
+            else:
+                for name in {store.record_name(i) for i in range(applied, store.n_records)}:
+                    if name in store:
+                        self._set(name, store.mean(name))
+                    elif name in self._rows:
+                        self._remove(name)
+            self._seen = (store.generation, store.n_records)
+
+    def add(self, name, embedding, save=True):
+        """
+        Add or replace a speaker's voiceprint, optionally saving it to the store.
+        """
+        self.add_takes(name, embedding, replace=True, save=save)
+
+    def add_takes(self, name, embeddings, replace=False, save=True):
+        """
+        Fold one or more enrolment embeddings into `name`'s voiceprint.
+        Returns the speaker's updated mean embedding.
+        """
+        with self._lock:
+            if not save:
+                takes = np.asarray(embeddings, dtype=np.float32)
+                mean = takes.reshape(-1, takes.shape[-1]).mean(axis=0)
+                self._set(name, mean)
+                return mean
+            self.store.add_takes(name, embeddings, replace=replace)
+            self.refresh(force=True)
+            return self.store.mean(name)
+
+    def remove(self, name):
+        with self._lock:
+            self.store.remove(name)
+            self.refresh(force=True)
+
+    def search(self, query, k=1):
+        """
+        Return the `k` most similar speakers as (name, cosine similarity)
+        pairs, best first.
+        """
+        self.refresh()
+        with self._lock:
+            if not self.names:
+                return []
+            scores = self.matrix @ self._normalize(query)
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.names[i], float(scores[i])) for i in top]
+
+
+_indexes = {}
+
+
+def get_index(speaker_db="speakers"):
+    """
+    Return the process-wide SpeakerIndex for `speaker_db`.
+    """
+    key = os.path.abspath(speaker_db)
+    if key not in _indexes:
+        _indexes[key] = SpeakerIndex(speaker_db)
+    return _indexes[key]
@@ -0,0 +1,332 @@
+"""
+Per-stage latency tracing, counters and metrics export.
+
+Wrap work in `span("name")` and count events with `count("name", label=...)`.
+Both do nothing until tracing is enabled (VOICE_AUTH_TRACE=1 or `enable()`):
+a disabled span is one flag check and a shared no-op context manager.
+
+When enabled, every span feeds a latency histogram. Spans opened inside
+`request("name")` are also attached to that request, and the slowest
+requests are kept with their span breakdown. With profiling on as well
+(VOICE_AUTH_PROFILE=1 or `enable(profile=True)`), a sampler thread records
+the call stacks of the threads working on each open request, and the
+slowest requests keep their most frequent stacks.
+
+Export with `prometheus_text()` (served at /metrics by server.py),
+`to_json()` or `dump(path)`.
+
+    python tracing.py metrics.json      # print a JSON dump as a table
+"""
+import os
+import sys
+import json
+import time
+import heapq
+import threading
+import contextvars
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SLOWEST_KEPT = 10           # requests kept with their span breakdown (and profile)
+PROFILE_INTERVAL = 0.005    # seconds between stack samples
+PROFILE_TOP_STACKS = 20
+
+_enabled = os.environ.get("VOICE_AUTH_TRACE", "0") == "1"
+_profile = os.environ.get("VOICE_AUTH_PROFILE", "0") == "1"
+_lock = threading.Lock()
+_histograms = {}            # span name -> _Histogram
+_counters = {}              # (name, sorted label items) -> count
+_slowest = []               # min-heap of (duration, seq, request summary)
+_seq = 0
+_current = contextvars.ContextVar("voice_auth_request", default=None)
+_open_requests = set()
+_sampler = None
+
+
+def enable(on=True, profile=None):
+    """
+    Turn tracing (and optionally the sampling profiler) on or off.
+    """
+    global _enabled, _profile
+    _enabled = on
+    if profile is not None:
+        _profile = profile
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """
+    Forget every recorded span, counter and slow request.
+    """
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _slowest.clear()
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+def _observe(name, seconds):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = _Histogram()
+        histogram.observe(seconds)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "start", "trace")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = _current.get()
+        if self.trace is not None:
+            self.trace.add_thread(threading.get_ident())
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        _observe(self.name, seconds)
+        if self.trace is not None:
+            self.trace.add_span(self.name, self.start, seconds)
+        return False
+
+
+def span(name):
+    """
+    Context manager timing one stage, e.g. `with span("generate"): ...`.
+    """
+    return _Span(name) if _enabled else _NOOP
+
+
+def count(name, n=1, **labels):
+    """
+    Increase the counter `name` (with optional labels) by `n`.
+    """
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+# ── Requests and the slowest-request profiler ─────────────────────────
+
+class _Trace:
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = []
+        self.threads = {threading.get_ident()}
+        self.samples = {}       # collapsed stack -> samples
+        self._lock = threading.Lock()
+
+    def add_thread(self, tid):
+        if tid not in self.threads:
+            with self._lock:
+                self.threads = self.threads | {tid}     # replaced, never mutated: the sampler iterates it
+
+    def add_span(self, name, start, seconds):
+        with self._lock:
+            self.spans.append((name, start - self.start, seconds))
+
+
+class _Request:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = _Trace(self.name)
+        self.token = _current.set(self.trace)
+        if _profile:
+            _start_sampler()
+            with _lock:
+                _open_requests.add(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc):
+        global _seq
+        _current.reset(self.token)
+        trace = self.trace
+        seconds = time.perf_counter() - trace.start
+        _observe(f"request:{trace.name}", seconds)
+        with _lock:
+            _open_requests.discard(trace)
+            if len(_slowest) < SLOWEST_KEPT or seconds > _slowest[0][0]:
+                summary = {
+                    "request": trace.name,
+                    "seconds": seconds,
+                    "spans": [{"name": n, "offset_s": o, "seconds": s} for n, o, s in sorted(trace.spans, key=lambda x: x[1])],
+                }
+                with trace._lock:
+                    samples = dict(trace.samples)
+                if samples:
+                    top = sorted(samples.items(), key=lambda item: -item[1])[:PROFILE_TOP_STACKS]
+                    summary["profile"] = [{"stack": stack, "samples": n} for stack, n in top]
+                _seq += 1
+                entry = (seconds, _seq, summary)
+                if len(_slowest) < SLOWEST_KEPT:
+                    heapq.heappush(_slowest, entry)
+                else:
+                    heapq.heapreplace(_slowest, entry)
+        return False
+
+
+def attach_thread():
+    """
+    Let the profiler sample the calling thread for the current request
+    (for worker threads that start working on it before opening a span).
+    """
+    trace = _current.get() if _enabled else None
+    if trace is not None:
+        trace.add_thread(threading.get_ident())
+
+
+def request(name):
+    """
+    Context manager for one end-to-end request; spans inside it (including
+    in `pipeline.run_parallel` threads) are attached to it.
+    """
+    return _Request(name) if _enabled else _NOOP
+
+
+def _collapse(frame, limit=40):
+    parts = []
+    while frame is not None and len(parts) < limit:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def _sample_loop():
+    me = threading.get_ident()
+    while True:
+        time.sleep(PROFILE_INTERVAL)
+        if not (_enabled and _profile):
+            continue
+        with _lock:
+            traces = list(_open_requests)
+        if not traces:
+            continue
+        frames = sys._current_frames()
+        for trace in traces:
+            for tid in trace.threads:
+                frame = frames.get(tid)
+                if frame is not None and tid != me:
+                    stack = _collapse(frame)
+                    with trace._lock:
+                        trace.samples[stack] = trace.samples.get(stack, 0) + 1
+
+
+def _start_sampler():
+    global _sampler
+    with _lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="trace-sampler", daemon=True)
+            _sampler.start()
+
+
+# ── Export ────────────────────────────────────────────────────────────
+
+def _label_text(labels):
+    return ",".join(f'{k}="{v}"' for k, v in labels)
+
+
+def prometheus_text():
+    """
+    Every histogram and counter in the Prometheus text exposition format.
+    """
+    lines = ["# TYPE voice_auth_span_seconds histogram"]
+    with _lock:
+        histograms = {name: (list(h.counts), h.count, h.total) for name, h in _histograms.items()}
+        counters = dict(_counters)
+    for name, (counts, n, total) in sorted(histograms.items()):
+        cumulative = 0
+        for bound, c in zip(BUCKETS + (float("inf"),), counts):
+            cumulative += c
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f'voice_auth_span_seconds_bucket{{span="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'voice_auth_span_seconds_sum{{span="{name}"}} {total:.6f}')
+        lines.append(f'voice_auth_span_seconds_count{{span="{name}"}} {n}')
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE voice_auth_{name}_total counter")
+        for (counter, labels), value in sorted(counters.items()):
+            if counter == name:
+                lines.append(f"voice_auth_{name}_total{{{_label_text(labels)}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def to_json():
+    """
+    Span summaries, counters and the slowest requests as a dict.
+    """
+    with _lock:
+        spans = {name: {"count": h.count, "total_s": h.total, "mean_s": h.total / h.count if h.count else 0.0,
+                        "p50_s": h.quantile(0.5), "p95_s": h.quantile(0.95), "p99_s": h.quantile(0.99),
+                        "max_s": h.max}
+                 for name, h in _histograms.items()}
+        counters = [{"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in _counters.items()]
+        slowest = [summary for _, _, summary in sorted(_slowest, reverse=True)]
+    return {"enabled": _enabled, "spans": spans, "counters": counters, "slowest_requests": slowest}
+
+
+def dump(path):
+    with open(path, "w") as f:
+        json.dump(to_json(), f, indent=2)
+    return path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python tracing.py metrics.json")
+        sys.exit(1)
+    with open(sys.argv[1]) as f:
+        data = json.load(f)
+    print(f"{'span':28s} {'count':>7} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for name, s in sorted(data["spans"].items(), key=lambda item: -item[1]["total_s"]):
+        print(f"{name:28s} {s['count']:>7} {s['mean_s'] * 1000:>9.1f} {s['p95_s'] * 1000:>9.1f} {s['max_s'] * 1000:>9.1f}")
+    for c in data["counters"]:
+        print(f"{c['name']} {c['labels']}: {c['value']}")
@@ -0,0 +1,145 @@
+"""
+Fast energy-based voice activity detection.
+
+Frames are scored by their RMS energy (the same measure as
+`noice_testing.compute_energy`, in dB) against an adaptive noise floor.
+`trim_silence` cuts leading and trailing silence before the expensive
+stages run, and `EndOfSpeechDetector` / `record_until_silence` stop a
+recording once the speaker has finished.
+"""
+import numpy as np
+
+from audio_utils import load_audio
+
+
+def frame_energy_db(audio, sr, frame_ms=20):
+    """
+    RMS energy in dBFS of consecutive `frame_ms` frames.
+    """
+    frame = max(1, int(sr * frame_ms / 1000))
+    n = len(audio) // frame
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = np.asarray(audio[:n * frame], dtype=np.float32).reshape(n, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-6))
+
+
+def speech_threshold_db(energy_db, margin_db=12.0, min_db=-50.0):
+    """
+    Energy threshold: the noise floor (10th percentile frame) plus `margin_db`,
+    but never below `min_db` so silent rooms do not turn noise into speech.
+    """
+    floor = np.percentile(energy_db, 10) if len(energy_db) else min_db
+    return max(floor + margin_db, min_db)
+
+
+def detect_speech(audio, sr, frame_ms=20, margin_db=12.0, hangover_ms=200):
+    """
+    Boolean speech mask, one entry per `frame_ms` frame. Short gaps of up to
+    `hangover_ms` between speech frames are bridged.
+    """
+    energy = frame_energy_db(audio, sr, frame_ms)
+    mask = energy > speech_threshold_db(energy, margin_db)
+    hang = int(hangover_ms / frame_ms)
+    if hang and mask.any():
+        # Dilate forward by `hang` frames so brief pauses stay inside the speech region
+        kernel = np.ones(hang + 1, dtype=int)
+        mask = np.convolve(mask.astype(int), kernel)[:len(mask)] > 0
+    return mask
+
+
+def trim_silence(audio, sr=16000, pad_ms=150, frame_ms=20, margin_db=12.0, orig_sr=None):
+    """
+    Cut leading and trailing silence, keeping `pad_ms` of context on each side.
+
+    Args:
+        audio (str | np.ndarray): Samples (or a path)
+        sr (int): Sample rate of `audio`
+        pad_ms (int): Silence kept before the first and after the last speech frame
+
+    Returns:
+        tuple: (trimmed samples, stats dict with original_s, kept_s, removed_s,
+        removed_ratio and speech_found). If no speech is found the audio is
+        returned untouched.
+    """
+    audio = load_audio(audio, sr, orig_sr=orig_sr)
+    original_s = len(audio) / sr
+    mask = detect_speech(audio, sr, frame_ms=frame_ms, margin_db=margin_db)
+    stats = {"original_s": original_s, "kept_s": original_s, "removed_s": 0.0,
+             "removed_ratio": 0.0, "speech_found": bool(mask.any())}
+    if not mask.any():
+        return audio, stats
+
+    frame = int(sr * frame_ms / 1000)
+    pad = int(sr * pad_ms / 1000)
+    speech = np.flatnonzero(mask)
+    start = max(0, speech[0] * frame - pad)
+    end = min(len(audio), (speech[-1] + 1) * frame + pad)
+    trimmed = audio[start:end]
+
+    stats["kept_s"] = len(trimmed) / sr
+    stats["removed_s"] = original_s - stats["kept_s"]
+    stats["removed_ratio"] = stats["removed_s"] / original_s if original_s else 0.0
+    return trimmed, stats
+
+
+class EndOfSpeechDetector:
+    """
+    Streaming end-of-speech detection for live capture.
+
+    The first `calibration_s` seconds set the noise floor. After speech has
+    been heard, `push` returns True once `silence_s` seconds in a row have
+    stayed below the speech threshold.
+    """
+
+    def __init__(self, sr=16000, frame_ms=20, silence_s=0.8, calibration_s=0.3, margin_db=12.0):
+        self.sr = sr
+        self.frame = int(sr * frame_ms / 1000)
+        self.frame_ms = frame_ms
+        self.silence_frames = int(silence_s * 1000 / frame_ms)
+        self.calibration_frames = max(1, int(calibration_s * 1000 / frame_ms))
+        self.margin_db = margin_db
+        self._calibration = []
+        self._threshold = None
+        self._leftover = np.zeros(0, dtype=np.float32)
+        self.speech_started = False
+        self._silent_run = 0
+
+    def push(self, block):
+        """
+        Feed captured samples; returns True when the speaker has stopped.
+        """
+        samples = np.concatenate([self._leftover, np.asarray(block, dtype=np.float32).reshape(-1)])
+        usable = len(samples) // self.frame * self.frame
+        self._leftover = samples[usable:]
+        for energy in frame_energy_db(samples[:usable], self.sr, self.frame_ms):
+            if self._threshold is None:
+                self._calibration.append(energy)
+                if len(self._calibration) >= self.calibration_frames:
+                    self._threshold = speech_threshold_db(np.array(self._calibration), self.margin_db, min_db=-50.0)
+                continue
+            if energy > self._threshold:
+                self.speech_started = True
+                self._silent_run = 0
+            elif self.speech_started:
+                self._silent_run += 1
+                if self._silent_run >= self.silence_frames:
+                    return True
+        return False
+
+
+def record_until_silence(blocks, sr=16000, silence_s=0.8):
+    """
+    Collect blocks (e.g. from `functions.mic_stream(duration=...)`) until the
+    speaker stops or the stream ends; returns the captured samples.
+    """
+    detector = EndOfSpeechDetector(sr, silence_s=silence_s)
+    captured = []
+    for block in blocks:
+        captured.append(np.asarray(block, dtype=np.float32).reshape(-1))
+        if detector.push(block):
+            break
+    if hasattr(blocks, "close"):
+        blocks.close()      # stops the microphone stream
+    return np.concatenate(captured) if captured else np.zeros(0, dtype=np.float32)
@@ -1,15 +1,13 @@
 import tempfile
 import os
-import torchaudio
-from speechbrain.inference.separation import SepformerSeparation as separator
-from speechbrain.utils.fetching import LocalStrategy
+import numpy as np
 
-model = separator.from_hparams(
-    source="speechbrain/sepformer-dns4-16k-enhancement",
-    #source = "NVIDIA/speech_enhancement",
-    savedir="pretrained_models/sepformer-dns4-16k-enhancement",
-    local_strategy=LocalStrategy.COPY
-)
+from audio_utils import load_audio, save_audio
+from enhancement_backends import get_backend, native_backend, select_backend
+from tracing import span, count
+
+# The Sepformer enhancer below is kept for reference; it is registered as
+# models.get("sepformer") and only loaded if someone revives it.
 
 #def voice_enhancement(filename):
 #    try:
@@ -30,7 +28,7 @@ model = separator.from_hparams(
 #            waveform = waveform.unsqueeze(0)
 #
 #        # Run enhancement
-#        est_sources = model.separate_batch(waveform)
+#        est_sources = models.get("sepformer").separate_batch(waveform)
 #        clean = est_sources[0].detach().cpu()
 #
 #        # Prepare shape for saving: [channels, samples]
@@ -55,58 +53,146 @@ model = separator.from_hparams(
 #        #return filename
 
 
-from clearvoice import ClearVoice
-import soundfile as sf
-# Initialize ClearVoice with the desired model
-myClearVoice = ClearVoice(task='speech_enhancement', model_names=['MossFormer2_SE_48K'])
+# "auto": the best ClearVoice model that runs at the input's rate (MossFormerGAN_SE_16K
+# for 16 kHz recordings, MossFormer2_SE_48K for 48 kHz), so no resampling round trip
+DEFAULT_BACKEND = "auto"
+
 
-def voice_enhancement(filename):
+def enhance_audio(audio, sr=16000, backend=DEFAULT_BACKEND, latency_budget_s=None):
     """
-    Enhance audio using ClearVoice and save to a temporary file.
-    Returns the path to the enhanced audio file.
+    Enhance an in-memory recording.
+
+    Args:
+        audio (str | np.ndarray): Samples recorded at `sr` (or a path)
+        sr (int): Sample rate of `audio`
+        backend (str): Enhancement backend name (see enhancement_backends.BACKENDS),
+            or "auto" for the best one that runs natively at `sr`
+        latency_budget_s (float): If given, use the best backend expected to finish
+            within this many seconds instead of `backend`
+
+    Returns:
+        tuple: (enhanced float32 samples, sample rate). If enhancement fails
+        the input is returned unenhanced at `sr`.
     """
     try:
-        # Get enhanced audio as numpy array
-        enhanced_audio = myClearVoice(input_path=filename, online_write=False)
-        
-        # Create a temporary file for the enhanced audio
-        temp_file = tempfile.NamedTemporaryFile(suffix="_enhanced.wav", delete=False)
-        temp_file.close()  # Close the file handle so we can write to it
-        
-        # Handle the (1, samples) format from ClearVoice
-        if enhanced_audio.ndim == 2 and enhanced_audio.shape[0] == 1:
-            # (1, samples) -> squeeze to 1D
-            audio_to_save = enhanced_audio.squeeze()
-        elif enhanced_audio.ndim == 2 and enhanced_audio.shape[1] == 1:
-            # (samples, 1) -> squeeze to 1D
-            audio_to_save = enhanced_audio.squeeze()
-        elif enhanced_audio.ndim == 1:
-            # Already 1D
-            audio_to_save = enhanced_audio
+        if latency_budget_s is not None:
+            audio = load_audio(audio, sr, orig_sr=sr)
+            chosen = select_backend(len(audio) / sr, latency_budget_s, sr=sr)
+        elif backend == "auto":
+            chosen = native_backend(sr)
         else:
-            # Take first channel if multiple channels
-            audio_to_save = enhanced_audio[0, :] if enhanced_audio.ndim == 2 else enhanced_audio
-
-        # Ensure audio is float32 and in the right range
-        if audio_to_save.dtype != 'float32':
-            audio_to_save = audio_to_save.astype('float32')
-        
-        # Normalize if values are outside [-1, 1] range
-        if audio_to_save.max() > 1.0 or audio_to_save.min() < -1.0:
-            print("Normalizing audio to [-1, 1] range")
-            audio_to_save = audio_to_save / max(abs(audio_to_save.max()), abs(audio_to_save.min()))
-        
-        # Save the enhanced audio to the temporary file
-        # Use 48kHz since that's what ClearVoice typically outputs
-        print(f"Saving to: {temp_file.name}")
-        sf.write(temp_file.name, audio_to_save, 48000, subtype='PCM_16')
-        
-        return temp_file.name
-        
+            chosen = get_backend(backend)
+        with span("enhance"):
+            return chosen.enhance(audio, sr)
     except Exception as e:
         print(f"Voice enhancement failed: {e}")
-        # If enhancement fails, return the original filename
-        #return filename
+        count("enhancement_failures")
+        return load_audio(audio, sr), sr
+
+
+def voice_enhancement(filename, output_path=None):
+    """
+    Enhance an audio file using ClearVoice and save the result.
+    Writes to `output_path`, or to a temporary file if none is given, and
+    returns the path to the enhanced audio file.
+    """
+    enhanced, sr = enhance_audio(filename)
+    if output_path is None:
+        temp_file = tempfile.NamedTemporaryFile(suffix="_enhanced.wav", delete=False)
+        temp_file.close()
+        output_path = temp_file.name
+    print(f"Saving to: {output_path}")
+    return save_audio(output_path, enhanced, sr)
+
+
+# ── Streaming ─────────────────────────────────────────────────────────
+
+class StreamingEnhancer:
+    """
+    Enhance audio chunk by chunk while it is still being recorded.
+
+    The input is cut into segments of `chunk_s + lookahead_s` seconds that
+    start every `chunk_s` seconds. Each segment is enhanced on its own and
+    consecutive segments are overlap-added over the look-ahead region with
+    complementary fades, so chunk borders do not click. A chunk is released
+    once the look-ahead after it has arrived, giving an algorithmic latency
+    of `chunk_s + lookahead_s` (see `latency_s`).
+    """
+
+    def __init__(self, sr=16000, chunk_s=1.0, lookahead_s=0.25, enhance=None):
+        if chunk_s <= 0 or lookahead_s < 0:
+            raise ValueError("chunk_s must be positive and lookahead_s non-negative")
+        self.sr = sr
+        self.enhance = enhance or enhance_audio
+        self.hop = int(chunk_s * sr)
+        self.overlap = int(lookahead_s * sr)
+        self.out_sr = None
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._tail = None       # faded-out end of the previous segment, at out_sr
+
+    @property
+    def latency_s(self):
+        return (self.hop + self.overlap) / self.sr
+
+    def _enhance_segment(self, segment, final=False):
+        enhanced, out_sr = self.enhance(segment, self.sr)
+        self.out_sr = out_sr
+        ratio = out_sr / self.sr
+        hop, overlap = round(self.hop * ratio), round(self.overlap * ratio)
+        # Truncate or zero-pad to the expected length (never wrap samples around)
+        enhanced = np.asarray(enhanced, dtype=np.float32).reshape(-1)
+        expected = round(len(segment) * ratio)
+        out = np.zeros(expected, dtype=np.float32)
+        out[:min(expected, len(enhanced))] = enhanced[:expected]
+        enhanced = out
+
+        if self._tail is not None:
+            n = min(len(self._tail), len(enhanced))
+            enhanced[:n] = enhanced[:n] * self._fade_in[:n] + self._tail[:n]
+            self._tail = None
+        if final:
+            return enhanced
+
+        self._fade_in = np.sin(0.5 * np.pi * (np.arange(overlap) + 0.5) / max(overlap, 1)) ** 2
+        self._tail = enhanced[hop:hop + overlap] * (1.0 - self._fade_in)
+        return enhanced[:hop]
+
+    def push(self, block):
+        """
+        Feed newly captured samples; returns whatever enhanced audio is ready
+        (possibly empty) at `out_sr`.
+        """
+        self._pending = np.concatenate([self._pending, np.asarray(block, dtype=np.float32).reshape(-1)])
+        ready = []
+        while len(self._pending) >= self.hop + self.overlap:
+            ready.append(self._enhance_segment(self._pending[:self.hop + self.overlap]))
+            self._pending = self._pending[self.hop:]
+        return np.concatenate(ready) if ready else np.zeros(0, dtype=np.float32)
+
+    def flush(self):
+        """
+        Enhance and return everything still buffered once recording has stopped.
+        """
+        if len(self._pending) == 0:
+            return np.zeros(0, dtype=np.float32)
+        out = self._enhance_segment(self._pending, final=True)
+        self._pending = np.zeros(0, dtype=np.float32)
+        return out
+
+
+def enhance_stream(blocks, sr=16000, chunk_s=1.0, lookahead_s=0.25, enhance=None):
+    """
+    Enhance an iterable of captured blocks, yielding (enhanced samples, sample rate)
+    as soon as each chunk is ready.
+    """
+    enhancer = StreamingEnhancer(sr, chunk_s=chunk_s, lookahead_s=lookahead_s, enhance=enhance)
+    for block in blocks:
+        out = enhancer.push(block)
+        if len(out):
+            yield out, enhancer.out_sr
+    out = enhancer.flush()
+    if len(out):
+        yield out, enhancer.out_sr
 
 
 #process single wave file
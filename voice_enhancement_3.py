@@ -1,22 +1,29 @@
-import subprocess
 import os
+import sys
 
-def denoise_with_cli(input_wav, output_dir=".", model="DeepFilterNet3"):
+from audio_utils import load_audio, save_audio
+from enhancement_backends import get_backend
+
+def denoise_with_deepfilter(input_wav, output_dir="."):
     """
-    Runs the deepFilter CLI on input_wav, placing the enhanced file in output_dir.
-    model can be "DeepFilterNet", "DeepFilterNet2", or "DeepFilterNet3" (default).
+    Runs DeepFilterNet3 on input_wav in-process, placing the enhanced file in output_dir.
+    The model is loaded once per process and reused for every file (unlike the
+    `deepFilter` CLI, which reloads it for each call).
     """
     os.makedirs(output_dir, exist_ok=True)
-    cmd = [
-        "deepFilter",
-        input_wav,
-        "--output-dir", output_dir,
-        "--model", model,
-    ]
-    subprocess.run(cmd, check=True)
+    backend = get_backend("deepfilternet")
+    enhanced, sr = backend.enhance(load_audio(input_wav, backend.native_sr), backend.native_sr)
     enhanced_path = os.path.join(output_dir, os.path.basename(input_wav))
-    return enhanced_path
+    return save_audio(enhanced_path, enhanced, sr)
 
-# Usage
-clean_file = denoise_with_cli("recorded_20250715_160338.wav")
-print("Enhanced file:", clean_file)
+# Usage: python voice_enhancement_3.py input.wav [more.wav ...] [--output-dir DIR]
+if __name__ == "__main__":
+    args = sys.argv[1:] or ["recorded_20250715_160338.wav"]
+    output_dir = "."
+    if "--output-dir" in args:
+        i = args.index("--output-dir")
+        output_dir = args[i + 1]
+        del args[i:i + 2]
+    for input_wav in args:
+        clean_file = denoise_with_deepfilter(input_wav, output_dir)
+        print("Enhanced file:", clean_file)
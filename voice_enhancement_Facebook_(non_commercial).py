@@ -1,33 +1,30 @@
-import torch
-import soundfile as sf
-from denoiser.pretrained import dns64
+import sys
+
+from audio_utils import load_audio, save_audio
+from enhancement_backends import get_backend
 
 # ─── CONFIGURE THESE ─────────────────────────────────────────────────────────
 # Path to your noisy WAV file:
 input_wav  = "recorded_20250715_162834.wav"
 # Path where you’d like your denoised output:
 output_wav = "enhanced_output.wav"
-# Choose your model: dns48, dns64, or master64      
-model_name = "dns64"
+# Enhancement backend (see enhancement_backends.BACKENDS); dns64 is the Facebook denoiser
+backend_name = "dns64"
 # ─────────────────────────────────────────────────────────────────────────────
 
-# 1) Load the model (this will download it once into your torch cache)
-model = getattr(__import__("denoiser.pretrained", fromlist=[model_name]), model_name)()
-model.eval()
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        input_wav, output_wav = sys.argv[1:]
+
+    # 1) The model is loaded once (and downloaded once into your torch cache) by the backend
+    backend = get_backend(backend_name)
 
-# 2) Read your file (and mix to mono if needed)
-audio, sr = sf.read(input_wav)
-if audio.ndim > 1:
-    audio = audio.mean(axis=1)
-# 3) Convert to a batch tensor of shape [batch, time]
-batch = torch.from_numpy(audio).float().unsqueeze(0)
+    # 2) Read your file as mono at the model's rate
+    audio = load_audio(input_wav, backend.native_sr)
 
-# 4) Denoise
-with torch.no_grad():
-    enhanced = model(batch)           # → shape [1, 1, time]
-# squeeze out the dims → [time]
-enhanced = enhanced.squeeze(0).squeeze(0).cpu().numpy()
+    # 3) Denoise
+    enhanced, sr = backend.enhance(audio, backend.native_sr)
 
-# 5) Write back to disk
-sf.write(output_wav, enhanced, sr)
-print(f"Denoised audio saved to: {output_wav}")
+    # 4) Write back to disk
+    save_audio(output_wav, enhanced, sr)
+    print(f"Denoised audio saved to: {output_wav}")
@@ -0,0 +1,327 @@
+"""
+Append-only, memory-mapped store of speaker voiceprints.
+
+Each speaker is described by running statistics of their enrolment
+embeddings: the number of takes, the element-wise sum and the element-wise
+sum of squares, so takes can be added later without keeping (or
+re-extracting) the old ones. Every update appends one fixed-size record
+with the speaker's new statistics; the newest record for a name wins and a
+record with a zero count removes the speaker. A speaker database holds
+two files:
+
+    voiceprints.bin    16-byte header + float32 records
+    voiceprints.names  generation line, then one speaker name per record
+
+Readers memory-map the record file read-only, so opening the store copies
+nothing and worker processes share the same pages. `compact()` rewrites
+both files with only the newest record per speaker. Writers (creation,
+legacy migration, appends and compaction) hold an exclusive lock on
+`voiceprints.lock`, so several processes can share one store.
+"""
+import os
+import glob
+import struct
+import secrets
+import threading
+import contextlib
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:         # Windows: writers are only serialised within a process
+    fcntl = None
+
+STORE_FILENAME = "voiceprints.bin"
+NAMES_FILENAME = "voiceprints.names"
+LOCK_FILENAME = "voiceprints.lock"
+_MAGIC = b"VPS1"
+_HEADER = struct.Struct("<4sIQ")     # magic, embedding dim, generation (changes on compaction)
+
+
+def _record_dtype(dim):
+    return np.dtype([("count", "<u4"), ("sum", "<f4", (dim,)), ("sumsq", "<f4", (dim,))])
+
+
+class VoiceprintStore:
+    """
+    Running per-speaker embedding statistics in `<speaker_db>/voiceprints.bin`.
+    """
+
+    def __init__(self, speaker_db="speakers"):
+        self.speaker_db = speaker_db
+        self.path = os.path.join(speaker_db, STORE_FILENAME)
+        self.names_path = os.path.join(speaker_db, NAMES_FILENAME)
+        self.dim = None
+        self.generation = None
+        self._records = None        # read-only memmap (or empty array) of every record
+        self._record_names = []     # record -> speaker name
+        self._names_offset = 0      # bytes of the names file already parsed
+        self._latest = {}           # live speaker name -> index of its newest record
+        self._lock = threading.RLock()
+        self._write_depth = 0       # nesting of _writing() in the thread holding _lock
+        self._lock_file = None
+        self.refresh()
+
+    def __len__(self):
+        return len(self._latest)
+
+    def __contains__(self, name):
+        return name in self._latest
+
+    def names(self):
+        return list(self._latest)
+
+    @property
+    def n_records(self):
+        return len(self._record_names)
+
+    def record_name(self, i):
+        return self._record_names[i]
+
+    # ── Reading ───────────────────────────────────────────────────────
+
+    def _reset(self):
+        self.dim = None
+        self.generation = None
+        self._records = None
+        self._record_names = []
+        self._names_offset = 0
+        self._latest = {}
+
+    def refresh(self):
+        """
+        Map records appended since the last call, or reopen the store if it
+        was compacted. Cheap when nothing changed (one read of the header).
+        """
+        with self._lock:
+            try:
+                with open(self.path, "rb") as f:
+                    magic, dim, generation = _HEADER.unpack(f.read(_HEADER.size))
+            except (FileNotFoundError, struct.error):
+                self._reset()
+                return
+            if magic != _MAGIC:
+                raise ValueError(f"{self.path} is not a voiceprint store")
+
+            if generation != self.generation:
+                # New or compacted store: start over once its names file matches
+                with open(self.names_path, "rb") as f:
+                    first = f.readline()
+                if not first.endswith(b"\n") or int(first, 16) != generation:
+                    return      # caught between the two renames of a compaction; retry later
+                self._reset()
+                self.dim, self.generation = dim, generation
+                self._names_offset = len(first)
+
+            with open(self.names_path, "rb") as f:
+                f.seek(self._names_offset)
+                chunk = f.read()
+            # Only complete lines: a writer may be halfway through appending
+            chunk = chunk[:chunk.rfind(b"\n") + 1]
+            self._names_offset += len(chunk)
+
+            start = self.n_records
+            self._record_names.extend(chunk.decode("utf-8").splitlines())
+            # Records are written before their names, so every named record is on disk
+            dtype = _record_dtype(self.dim)
+            n = self.n_records
+            if n == 0:
+                self._records = np.zeros(0, dtype=dtype)
+            elif self._records is None or len(self._records) != n:
+                self._records = np.memmap(self.path, dtype=dtype, mode="r", offset=_HEADER.size, shape=(n,))
+
+            for i in range(start, n):
+                name = self._record_names[i]
+                if self._records[i]["count"]:
+                    self._latest[name] = i
+                else:
+                    self._latest.pop(name, None)
+
+    def stats(self, name):
+        """
+        (count, sum, sum of squares) of `name`'s enrolment embeddings.
+        """
+        record = self._records[self._latest[name]]
+        return int(record["count"]), np.array(record["sum"]), np.array(record["sumsq"])
+
+    def mean(self, name):
+        count, total, _ = self.stats(name)
+        return total / count
+
+    def variance(self, name):
+        """
+        Per-dimension variance of `name`'s takes (zeros for a single take).
+        """
+        count, total, sumsq = self.stats(name)
+        mean = total / count
+        return np.maximum(sumsq / count - mean ** 2, 0.0)
+
+    def means(self):
+        """
+        (names, matrix of mean embeddings) for every live speaker.
+        """
+        names = self.names()
+        if not names:
+            return names, np.zeros((0, self.dim or 0), dtype=np.float32)
+        records = self._records[[self._latest[name] for name in names]]
+        return names, records["sum"] / records["count"][:, np.newaxis].astype(np.float32)
+
+    # ── Writing ───────────────────────────────────────────────────────
+
+    @contextlib.contextmanager
+    def _writing(self):
+        """
+        Hold the store's thread lock and the inter-process file lock
+        (re-entrant, so writers can call each other).
+        """
+        with self._lock:
+            if self._write_depth == 0:
+                os.makedirs(self.speaker_db, exist_ok=True)
+                self._lock_file = open(os.path.join(self.speaker_db, LOCK_FILENAME), "a")
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+                if self._write_depth == 0:
+                    self._lock_file.close()     # closing releases the flock
+                    self._lock_file = None
+
+    def _create(self, dim):
+        os.makedirs(self.speaker_db, exist_ok=True)
+        generation = secrets.randbits(63)
+        with open(self.names_path, "w", encoding="utf-8") as f:
+            f.write(f"{generation:016x}\n")
+        with open(self.path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, dim, generation))
+
+    def _append(self, names, counts, sums, sumsqs):
+        with self._writing():
+            self.refresh()
+            if self.dim is None:
+                self._create(sums.shape[1])
+                self.refresh()
+            if sums.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {sums.shape[1]}, store expects {self.dim}")
+            for name in names:
+                if not name or "\n" in name:
+                    raise ValueError(f"Invalid speaker name {name!r}")
+
+            records = np.zeros(len(names), dtype=_record_dtype(self.dim))
+            records["count"] = counts
+            records["sum"] = sums
+            records["sumsq"] = sumsqs
+            # Drop records left without a name by an interrupted append
+            os.truncate(self.path, _HEADER.size + self.n_records * records.dtype.itemsize)
+            with open(self.path, "ab") as f:
+                f.write(records.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.names_path, "a", encoding="utf-8") as f:
+                f.write("".join(name + "\n" for name in names))
+            self.refresh()
+
+    def add_takes(self, name, embeddings, replace=False):
+        """
+        Fold one embedding or a (takes, dim) array into `name`'s voiceprint.
+        With `replace`, earlier takes are discarded.
+        """
+        takes = np.asarray(embeddings, dtype=np.float32)
+        takes = takes.reshape(-1, takes.shape[-1])
+        count, total, sumsq = len(takes), takes.sum(axis=0), (takes ** 2).sum(axis=0)
+        with self._writing():
+            self.refresh()
+            if not replace and name in self._latest:
+                old_count, old_total, old_sumsq = self.stats(name)
+                count, total, sumsq = count + old_count, total + old_total, sumsq + old_sumsq
+            self._append([name], [count], total[np.newaxis], sumsq[np.newaxis])
+
+    def add_many(self, names, embeddings):
+        """
+        Enrol many speakers (one embedding each, replacing any voiceprint) in one append.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(names), -1)
+        self._append(list(names), np.ones(len(names)), embeddings, embeddings ** 2)
+
+    def remove(self, name):
+        with self._writing():
+            self.refresh()
+            if name in self._latest:
+                zeros = np.zeros((1, self.dim), dtype=np.float32)
+                self._append([name], [0], zeros, zeros)
+
+    def stale_records(self):
+        """
+        Records that a compaction would drop (superseded updates and removals).
+        """
+        return self.n_records - len(self._latest)
+
+    def compact(self):
+        """
+        Rewrite the store with only the newest record of each live speaker.
+        Returns the number of records dropped.
+        """
+        with self._writing():
+            self.refresh()
+            if self.dim is None:
+                return 0
+            dropped = self.stale_records()
+            names = self.names()
+            records = np.array(self._records[[self._latest[name] for name in names]]) \
+                if names else np.zeros(0, dtype=_record_dtype(self.dim))
+            generation = secrets.randbits(63)
+
+            tmp_path, tmp_names = self.path + ".tmp", self.names_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, self.dim, generation))
+                f.write(records.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(tmp_names, "w", encoding="utf-8") as f:
+                f.write(f"{generation:016x}\n" + "".join(name + "\n" for name in names))
+
+            self._records = None        # release the mapping before replacing the file
+            os.replace(tmp_path, self.path)
+            os.replace(tmp_names, self.names_path)
+            self._reset()
+            self.refresh()
+            return dropped
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_voiceprint_store(speaker_db="speakers"):
+    """
+    Return the process-wide store for `speaker_db`. The first time the store
+    is created, legacy `<name>.npy` voiceprints in the folder are imported
+    (once, by whichever process gets the write lock first).
+    """
+    key = os.path.abspath(speaker_db)
+    with _stores_lock:
+        if key not in _stores:
+            store = VoiceprintStore(speaker_db)
+            paths = sorted(glob.glob(os.path.join(speaker_db, "*.npy"))) if store.dim is None else []
+            if paths:
+                with store._writing():
+                    store.refresh()     # another process may have migrated while we waited
+                    if store.dim is None:
+                        names = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+                        store.add_many(names, np.stack([np.load(p).reshape(-1) for p in paths]))
+                        print(f"Migrated {len(paths)} voiceprints from {speaker_db}/*.npy to {store.path}")
+            _stores[key] = store
+        return _stores[key]
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python voiceprint_store.py compact speakers  – drop superseded records
+    if len(sys.argv) != 3 or sys.argv[1] != "compact":
+        print("Usage: python voiceprint_store.py compact <speaker_db>")
+        sys.exit(1)
+    store = get_voiceprint_store(sys.argv[2])
+    print(f"Dropped {store.compact()} records; {len(store)} speakers in {store.path}")